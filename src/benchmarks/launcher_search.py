@@ -0,0 +1,191 @@
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field
+
+from utils.search_index import SearchIndex
+
+APP_WORDS = [
+    "firefox", "chromium", "terminal", "files", "settings", "editor", "studio",
+    "player", "music", "video", "image", "viewer", "office", "writer", "calc",
+    "impress", "steam", "proton", "wine", "lutris", "discord", "telegram",
+    "code", "monitor", "system", "network", "bluetooth", "printer", "archive",
+    "manager", "browser", "mail", "calendar", "notes", "camera", "screenshot",
+    "recorder", "torrent", "game", "launcher", "emulator", "designer", "paint",
+]
+CYRILLIC_WORDS = [
+    "редактор", "терминал", "файлы", "настройки", "проигрыватель", "музыка",
+    "видео", "браузер", "почта", "календарь", "заметки", "игра", "монитор",
+]
+SYLLABLES = ["ka", "ro", "ti", "ne", "vo", "lu", "mi", "sa", "de", "po", "ки", "ра", "но", "ле"]
+COMMAND_NAMES = [
+    "Search in Browser", "Clipboard", "Wallpaper Changer", "Color Picker",
+    "Disable Live Wallpaper", "Lock Screen", "Shutdown", "Logout", "Reboot",
+]
+
+
+@dataclass
+class SyntheticApp:
+    name: str
+    display_name: str
+    description: str
+    keywords: list[str] = field(default_factory=list)
+    executable: str = ""
+    generic_name: str | None = None
+
+    @property
+    def id(self) -> str:
+        return f"{self.executable}.desktop"
+
+
+def generate_catalog(size: int, rng: random.Random) -> list[SyntheticApp]:
+    vocabulary = APP_WORDS + CYRILLIC_WORDS + [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))) for _ in range(size // 4)
+    ]
+    weights = [1 / (rank + 1) ** 0.8 for rank in range(len(vocabulary))]
+
+    def words(count: int) -> list[str]:
+        return rng.choices(vocabulary, weights, k=count)
+
+    apps = []
+    for number in range(size):
+        name = " ".join(word.capitalize() for word in words(rng.randint(1, 3)))
+        apps.append(
+            SyntheticApp(
+                name=name,
+                display_name=name,
+                description=" ".join(words(rng.randint(3, 12))).capitalize(),
+                keywords=words(rng.randint(0, 4)),
+                executable=f"{name.split()[0].casefold()}-{number}",
+            )
+        )
+    return apps
+
+
+def generate_commands() -> list[SyntheticApp]:
+    return [
+        SyntheticApp(name=name, display_name=name, description=name, executable=f"command-{index}")
+        for index, name in enumerate(COMMAND_NAMES)
+    ]
+
+
+def typing_sequences(apps: list[SyntheticApp], count: int, prefix: str, rng: random.Random) -> list[list[str]]:
+    sequences = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.1:
+            target = prefix + rng.choice(COMMAND_NAMES).casefold()[: rng.randint(1, 8)]
+        elif kind < 0.25:
+            app = rng.choice(apps)
+            target = " ".join(word[: rng.randint(2, 5)] for word in app.name.split()[:2])
+        else:
+            target = rng.choice(apps).name[: rng.randint(3, 12)]
+
+        keystrokes = []
+        text = ""
+        for char in target:
+            if rng.random() < 0.05:
+                keystrokes.append(text + rng.choice("qxzj"))
+            text += char
+            keystrokes.append(text)
+        for length in range(len(text) - 1, -1, -1):
+            if rng.random() < 0.5:
+                break
+            keystrokes.append(text[:length])
+        sequences.append(keystrokes)
+    return sequences
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def run(size: int, sequences_count: int, prefix: str, limit: int | None, seed: int) -> dict:
+    rng = random.Random(seed)
+    apps = generate_catalog(size, rng)
+    commands = generate_commands()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    app_index = SearchIndex(apps, key=lambda app: app.id)
+    command_index = SearchIndex(commands, key=lambda app: app.id)
+    build_ms = (time.perf_counter() - start) * 1000
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    boosts = {app.id: rng.random() for app in rng.sample(apps, min(len(apps), 100))}
+    sequences = typing_sequences(apps, sequences_count, prefix, rng)
+
+    def search(text: str) -> list:
+        text = text.strip()
+        if text.startswith(prefix):
+            return command_index.search(text[len(prefix):], limit, boosts)
+        return app_index.search(text, limit, boosts)
+
+    latencies = []
+    for keystrokes in sequences:
+        for text in keystrokes:
+            start = time.perf_counter()
+            search(text)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    for keystrokes in sequences[: max(1, sequences_count // 4)]:
+        for text in keystrokes:
+            tracemalloc.reset_peak()
+            before_memory = tracemalloc.get_traced_memory()[0]
+            before_blocks = sys.getallocatedblocks()
+            search(text)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before_memory)
+            blocks.append(sys.getallocatedblocks() - before_blocks)
+    tracemalloc.stop()
+
+    return {
+        "size": size,
+        "build_ms": build_ms,
+        "index_mib": index_bytes / 1024 / 1024,
+        "keystrokes": len(latencies),
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+        "peak_kib": sum(peaks) / len(peaks) / 1024,
+        "blocks": sum(blocks) / len(blocks),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description="Replay synthetic typing against the launcher search index. "
+        "Run from src/: python -m benchmarks.launcher_search",
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--sequences", type=int, default=200)
+    parser.add_argument("--prefix", default=">")
+    parser.add_argument("--limit", type=int, default=50, help="results per query, 0 for all; the launcher asks for one page")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail when p95 latency exceeds this")
+    args = parser.parse_args()
+
+    header = f"{'catalog':>8} {'build ms':>9} {'index MiB':>9} {'keys':>6} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'max ms':>7} {'peak KiB':>9} {'net blocks':>10}"
+    print(header)
+    failed = False
+    for size in args.sizes:
+        result = run(size, args.sequences, args.prefix, args.limit or None, args.seed)
+        print(
+            f"{result['size']:>8} {result['build_ms']:>9.1f} {result['index_mib']:>9.1f} "
+            f"{result['keystrokes']:>6} {result['p50']:>7.3f} {result['p95']:>7.3f} "
+            f"{result['p99']:>7.3f} {result['max']:>7.3f} {result['peak_kib']:>9.1f} {result['blocks']:>10.1f}"
+        )
+        if args.budget_ms is not None and result["p95"] > args.budget_ms:
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,7 @@
-import subprocess
-
 from commands.launcher import CustomCommand
 from utils.path import get_root_path
 from utils.notify_system import send_notification
+from utils.process import spawn
 
 
 class ColorPickerCommand(CustomCommand):
@@ -15,16 +14,15 @@ class ColorPickerCommand(CustomCommand):
         )
 
     def launch(self):
-        proc = subprocess.Popen(
-            "hyprpicker -a", shell=True, stdout=subprocess.PIPE, text=True
-        )
-        color, _ = proc.communicate()
-        color = color.strip()
+        spawn(["hyprpicker", "-a"], on_done=self.on_color_picked, capture_output=True)
+
+    def on_color_picked(self, returncode, output):
+        color = output.decode(errors="replace").strip()
 
         if not color:
             return
 
-        subprocess.run(["wl-copy"], input=color, text=True)
+        spawn(["wl-copy"], input=color.encode())
 
         send_notification(
             "Color Picker", "Color copied to clipboard", urgency="low", color_icon=color
@@ -1,12 +1,13 @@
-from gi.repository import GdkPixbuf
-
+from utils.icon_cache import icon_cache
 from utils.path import get_root_path
+from utils.process import parse_command, spawn
 
 class CustomCommand:
     def __init__(self, name: str, description: str, command: str | list[str], icon_path: str | None = None):
         self.name = name
         self.description = description
         self.command = command
+        self.argv = parse_command(command)
         self.icon_path = icon_path or str(get_root_path() / "icons" / "default.png")
 
     @property
@@ -14,14 +15,7 @@ class CustomCommand:
         return self.name
 
     def launch(self):
-        import subprocess
-        shell = True if isinstance(self.command, str) else False
-        subprocess.Popen(self.command, shell=shell)
+        spawn(self.argv)
 
     def get_icon_pixbuf(self, size=24):
-        try:
-            return GdkPixbuf.Pixbuf.new_from_file_at_size(self.icon_path, size, size)
-        except Exception:
-            import traceback
-            traceback.print_exc()
-            return None
+        return icon_cache.load(self.icon_path, size)
@@ -3,27 +3,6 @@ import signal
 
 from utils.notify_system import send_notification
 
-try:
-    from fabric import Application
-except ImportError:
-    send_notification(
-        "Fabric Launcher",
-        "Fabric Launcher is not installed\n```bash\nyay -S python-fabric-git\n```",
-        urgency="critical",
-        app_name="EXS Launcher",
-    )
-    exit(1)
-
-from widgets.launcher import Launcher
-from widgets.clipboard import Clipboard
-from widgets.wallpaper import WallpaperChooser
-from widgets.firefox_search import FirefoxSearch
-from widgets.osd import OSD
-from widgets.bar import Bar, Corners
-
-from utils.path import get_root_path
-from utils.load_config import config
-
 
 def handle_exit(signum, frame):
     send_notification(
@@ -32,7 +11,33 @@ def handle_exit(signum, frame):
     exit(0)
 
 
-if __name__ == "__main__":
+# Kept out of module scope so thumbnail worker processes, which re-import
+# this file as __mp_main__, do not load fabric and GTK. The windows stay
+# module globals because fabric-cli exec evaluates commands against them.
+def main():
+    global bar, corners, launcher, clipboard, wallpaper, browser, osd, app
+
+    try:
+        from fabric import Application
+    except ImportError:
+        send_notification(
+            "Fabric Launcher",
+            "Fabric Launcher is not installed\n```bash\nyay -S python-fabric-git\n```",
+            urgency="critical",
+            app_name="EXS Launcher",
+        )
+        exit(1)
+
+    from widgets.launcher import Launcher
+    from widgets.clipboard import Clipboard
+    from widgets.wallpaper import WallpaperChooser
+    from widgets.firefox_search import FirefoxSearch
+    from widgets.osd import OSD
+    from widgets.bar import Bar, Corners
+
+    from utils.path import get_root_path
+    from utils.load_config import config
+
     try:
         signal.signal(signal.SIGTERM, handle_exit)
         signal.signal(signal.SIGINT, handle_exit)
@@ -71,3 +76,7 @@ if __name__ == "__main__":
             app_name="EXS Launcher",
         )
         exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from gi.repository import Gio, GLib
+
+from fabric.core.service import Service, Signal
+
+from utils.icon_cache import icon_cache
+from utils.path import get_cache_path
+
+CACHE_VERSION = 2
+
+
+def get_application_dirs() -> list[Path]:
+    data_dirs = [GLib.get_user_data_dir(), *GLib.get_system_data_dirs()]
+    return [Path(data_dir) / "applications" for data_dir in data_dirs]
+
+
+def parse_desktop_file(path: str, desktop_id: str, mtime: int) -> dict:
+    record = {"id": desktop_id, "path": path, "mtime": mtime, "show": False}
+    try:
+        app_info = Gio.DesktopAppInfo.new_from_filename(path)
+    except TypeError:
+        app_info = None
+    if app_info is None:
+        return record
+
+    icon = app_info.get_icon()
+    record.update(
+        show=app_info.should_show(),
+        name=app_info.get_name(),
+        display_name=app_info.get_display_name(),
+        generic_name=app_info.get_generic_name(),
+        description=app_info.get_description(),
+        keywords=list(app_info.get_keywords() or ()),
+        executable=app_info.get_executable(),
+        icon_name=icon.to_string() if icon is not None else None,
+    )
+    return record
+
+
+class DesktopEntry:
+    def __init__(self, record: dict):
+        self.record = record
+        self.id = record["id"]
+        self.path = record["path"]
+        self.name = record["name"]
+        self.display_name = record["display_name"]
+        self.generic_name = record["generic_name"]
+        self.description = record["description"]
+        self.keywords = record["keywords"]
+        self.executable = record["executable"]
+        self.icon_name = record["icon_name"]
+
+    def launch(self):
+        app_info = Gio.DesktopAppInfo.new_from_filename(self.path)
+        if app_info is not None:
+            return app_info.launch([], None)
+
+    def get_icon_pixbuf(self, size=48):
+        return icon_cache.load(self.icon_name, size)
+
+
+class AppCatalog(Service):
+    @Signal
+    def changed(self, added: object, removed: object) -> None: ...
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cache_file = get_cache_path() / "desktop-entries.json"
+        self._records: dict[str, dict] = {}
+        self._entries: dict[str, DesktopEntry] = {}
+        self._monitors: dict[str, Gio.FileMonitor] = {}
+        self._rescan_id = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="app-catalog")
+
+        self._load_cache()
+        self._update_entries(self._records)
+        self.rescan()
+
+        self._app_info_monitor = Gio.AppInfoMonitor.get()
+        self._app_info_monitor.connect("changed", lambda *_: self.queue_rescan())
+
+    @property
+    def applications(self) -> list[DesktopEntry]:
+        return sorted(
+            self._entries.values(),
+            key=lambda entry: (entry.display_name or entry.name or "").casefold(),
+        )
+
+    def queue_rescan(self, delay: int = 300):
+        if self._rescan_id is not None:
+            GLib.source_remove(self._rescan_id)
+
+        def rescan():
+            self._rescan_id = None
+            self.rescan()
+            return False
+
+        self._rescan_id = GLib.timeout_add(delay, rescan)
+
+    # Desktop files are read on a worker thread; the cached records are
+    # already listed, so startup does not wait for the scan.
+    def rescan(self):
+        known = self._records
+        future = self._executor.submit(self._scan_records, known)
+        future.add_done_callback(lambda future: GLib.idle_add(self._finish_rescan, known, *future.result()))
+
+    def _scan_records(self, known: dict[str, dict]) -> tuple[dict[str, dict], set[str]]:
+        records = {}
+        seen_ids = set()
+        directories = set()
+
+        for base in get_application_dirs():
+            for path, desktop_id, mtime in self._scan(base, base, directories):
+                if desktop_id in seen_ids:
+                    continue
+                seen_ids.add(desktop_id)
+
+                record = known.get(path)
+                if record is None or record["mtime"] != mtime or record["id"] != desktop_id:
+                    record = parse_desktop_file(path, desktop_id, mtime)
+                records[path] = record
+        return records, directories
+
+    def _finish_rescan(self, known: dict[str, dict], records: dict[str, dict], directories: set[str]):
+        parsed = any(known.get(path) is not record for path, record in records.items())
+        if parsed or records.keys() != known.keys():
+            self._records = records
+            self._save_cache()
+        self._update_monitors(directories)
+        self._update_entries(self._records)
+        return False
+
+    def _update_entries(self, records: dict[str, dict]):
+        entries = {}
+        added = []
+        for record in records.values():
+            if not record["show"]:
+                continue
+            entry = self._entries.get(record["id"])
+            if entry is None or entry.record is not record:
+                entry = DesktopEntry(record)
+                added.append(entry)
+            entries[entry.id] = entry
+
+        removed = [
+            entry
+            for desktop_id, entry in self._entries.items()
+            if entries.get(desktop_id) is not entry
+        ]
+        self._entries = entries
+
+        if added or removed:
+            self.changed(added, removed)
+
+    def _scan(self, base: Path, directory: Path, directories: set[str]):
+        try:
+            iterator = os.scandir(directory)
+        except OSError:
+            return
+        directories.add(str(directory))
+        with iterator:
+            for item in iterator:
+                try:
+                    if item.is_dir():
+                        yield from self._scan(base, Path(item.path), directories)
+                    elif item.name.endswith(".desktop"):
+                        desktop_id = os.path.relpath(item.path, base).replace(os.sep, "-")
+                        yield item.path, desktop_id, item.stat().st_mtime_ns
+                except OSError:
+                    continue
+
+    def _update_monitors(self, directories: set[str]):
+        for base in get_application_dirs():
+            directories.add(str(base))
+
+        for directory in self._monitors.keys() - directories:
+            self._monitors.pop(directory).cancel()
+
+        for directory in directories - self._monitors.keys():
+            monitor = Gio.File.new_for_path(directory).monitor_directory(
+                Gio.FileMonitorFlags.WATCH_MOVES, None
+            )
+            monitor.connect("changed", self._on_directory_changed)
+            self._monitors[directory] = monitor
+
+    def _on_directory_changed(self, monitor, file, other_file, event_type):
+        if event_type in (
+            Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+            Gio.FileMonitorEvent.DELETED,
+            Gio.FileMonitorEvent.CREATED,
+            Gio.FileMonitorEvent.MOVED_IN,
+            Gio.FileMonitorEvent.MOVED_OUT,
+            Gio.FileMonitorEvent.RENAMED,
+        ):
+            self.queue_rescan()
+
+    def _cache_environment(self) -> list[str]:
+        return [os.environ.get("XDG_CURRENT_DESKTOP", ""), *GLib.get_language_names()]
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_VERSION or data.get("environment") != self._cache_environment():
+            return
+        self._records = {record["path"]: record for record in data.get("entries", [])}
+
+    def _save_cache(self):
+        data = {
+            "version": CACHE_VERSION,
+            "environment": self._cache_environment(),
+            "entries": list(self._records.values()),
+        }
+        temp_file = self.cache_file.with_suffix(".tmp")
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.cache_file)
+        except OSError:
+            import traceback
+            traceback.print_exc()
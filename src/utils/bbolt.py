@@ -0,0 +1,191 @@
+import fcntl
+import mmap
+import os
+import struct
+import time
+from typing import Iterator
+
+MAGIC = 0xED0CDAED
+VERSION = 2
+PAGE_HEADER = struct.Struct("<QHHI")
+META = struct.Struct("<IIII QQ QQQ Q")
+ELEMENT_SIZE = 16
+BRANCH_ELEMENT = struct.Struct("<IIQ")
+LEAF_ELEMENT = struct.Struct("<IIII")
+BUCKET_HEADER = struct.Struct("<QQ")
+
+BRANCH_PAGE = 0x01
+LEAF_PAGE = 0x02
+BUCKET_LEAF = 0x01
+
+FNV_OFFSET = 0xCBF29CE484222325
+FNV_PRIME = 0x100000001B3
+
+
+class BoltError(Exception):
+    pass
+
+
+def fnv64a(data: bytes) -> int:
+    value = FNV_OFFSET
+    for byte in data:
+        value = ((value ^ byte) * FNV_PRIME) & 0xFFFFFFFFFFFFFFFF
+    return value
+
+
+class Bucket:
+    def __init__(self, db: "BoltDB", root: int, inline: memoryview | None = None):
+        self.db = db
+        self.root = root
+        self.inline = inline
+
+    def get(self, key: bytes) -> memoryview | None:
+        page = self._page(self.root)
+        while True:
+            flags, count, data = page
+            if flags & LEAF_PAGE:
+                for element_flags, element_key, value in self._leaf_elements(data, count):
+                    if element_key == key:
+                        return None if element_flags & BUCKET_LEAF else value
+                return None
+            child = None
+            for element_key, pgid in self._branch_elements(data, count):
+                if element_key > key:
+                    break
+                child = pgid
+            if child is None:
+                return None
+            page = self._page(child)
+
+    def bucket(self, name: bytes) -> "Bucket | None":
+        for flags, key, value in self._walk(self._page(self.root), False):
+            if key == name and flags & BUCKET_LEAF:
+                root, _ = BUCKET_HEADER.unpack_from(value)
+                return Bucket(self.db, root, value[BUCKET_HEADER.size:] if root == 0 else None)
+        return None
+
+    def items(self, reverse: bool = False) -> Iterator[tuple[bytes, memoryview]]:
+        for flags, key, value in self._walk(self._page(self.root), reverse):
+            if not flags & BUCKET_LEAF:
+                yield key, value
+
+    def _page(self, pgid: int) -> tuple[int, int, memoryview]:
+        if self.inline is not None:
+            data = self.inline
+        else:
+            offset = pgid * self.db.page_size
+            data = self.db.data[offset:]
+        if len(data) < PAGE_HEADER.size:
+            raise BoltError(f"page {pgid} is out of bounds")
+        _, flags, count, _ = PAGE_HEADER.unpack_from(data)
+        return flags, count, data
+
+    def _walk(self, page: tuple[int, int, memoryview], reverse: bool):
+        flags, count, data = page
+        if flags & LEAF_PAGE:
+            elements = self._leaf_elements(data, count)
+            yield from reversed(list(elements)) if reverse else elements
+        elif flags & BRANCH_PAGE:
+            children = [pgid for _, pgid in self._branch_elements(data, count)]
+            for pgid in reversed(children) if reverse else children:
+                yield from self._walk(self._page(pgid), reverse)
+        else:
+            raise BoltError(f"unexpected page flags {flags:#x}")
+
+    def _branch_elements(self, data: memoryview, count: int):
+        for index in range(count):
+            offset = PAGE_HEADER.size + index * ELEMENT_SIZE
+            pos, ksize, pgid = BRANCH_ELEMENT.unpack_from(data, offset)
+            yield bytes(data[offset + pos:offset + pos + ksize]), pgid
+
+    def _leaf_elements(self, data: memoryview, count: int):
+        for index in range(count):
+            offset = PAGE_HEADER.size + index * ELEMENT_SIZE
+            flags, pos, ksize, vsize = LEAF_ELEMENT.unpack_from(data, offset)
+            start = offset + pos
+            yield flags, bytes(data[start:start + ksize]), data[start + ksize:start + ksize + vsize]
+
+
+class BoltDB:
+    def __init__(self, path: str | os.PathLike, lock_timeout: float = 0.1):
+        self.path = path
+        self.lock_timeout = lock_timeout
+        self.page_size = 0
+        self.root: Bucket | None = None
+        self.data: memoryview | None = None
+        self._file = None
+        self._mmap = None
+
+    def __enter__(self) -> "BoltDB":
+        self.open()
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def open(self):
+        self._file = open(self.path, "rb")
+        try:
+            self._lock()
+            size = os.fstat(self._file.fileno()).st_size
+            if size == 0:
+                raise BoltError("database is empty")
+            self._mmap = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+            self.data = memoryview(self._mmap)
+            self._read_meta()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.data is not None:
+            self.data.release()
+            self.data = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def bucket(self, name: bytes) -> Bucket | None:
+        return self.root.bucket(name)
+
+    def _lock(self):
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+                return
+            except BlockingIOError:
+                if time.monotonic() >= deadline:
+                    raise BoltError("database is locked by a writer")
+                time.sleep(0.005)
+
+    def _read_meta(self):
+        metas = []
+        page_size = 4096
+        for index in range(2):
+            meta = self._parse_meta(index * page_size)
+            if meta is not None:
+                metas.append(meta)
+                page_size = meta[2]
+        if not metas:
+            raise BoltError("no valid meta page")
+        meta = max(metas, key=lambda meta: meta[8])
+        self.page_size = meta[2]
+        self.root = Bucket(self, meta[4])
+
+    def _parse_meta(self, offset: int) -> tuple | None:
+        start = offset + PAGE_HEADER.size
+        if len(self.data) < start + META.size:
+            return None
+        meta = META.unpack_from(self.data, start)
+        if meta[0] != MAGIC or meta[1] != VERSION:
+            return None
+        if fnv64a(self.data[start:start + META.size - 8]) != meta[9]:
+            return None
+        return meta
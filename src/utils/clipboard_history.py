@@ -1,17 +1,236 @@
+import hashlib
+import os
+import struct
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from gi.repository import Gio, GLib
+
+from utils.bbolt import BoltDB, BoltError
+from utils.process import Process, spawn
+
+CLIPHIST_BUCKET = b"b"
+PREVIEW_SCAN_BYTES = 64 * 1024
+
+HistoryCallback = Callable[[list[dict] | None], None]
+
+
+def parse_history_line(line: str) -> dict | None:
+    idx, separator, raw = line.partition("\t")
+    if not separator:
+        return None
+    return {
+        "id": idx,
+        "raw": raw,
+        "is_binary": "[[ binary data" in raw,
+    }
 
 
 def get_clipboard_history(limit=50):
-    result = subprocess.run(["cliphist", "list"], capture_output=True, text=True)
-    if result.returncode == 0:
-        lines = result.stdout.strip().split("\n")
+    try:
+        proc = subprocess.Popen(["cliphist", "list"], stdout=subprocess.PIPE, text=True)
+    except OSError:
+        return []
+    history = []
+    with proc:
+        for line in proc.stdout:
+            entry = parse_history_line(line.rstrip("\n"))
+            if entry is not None:
+                history.append(entry)
+            if len(history) >= limit:
+                proc.terminate()
+                break
+    if proc.returncode not in (0, -15) and len(history) < limit:
+        return []
+    return history
+
+
+def load_clipboard_history(
+    on_loaded: HistoryCallback,
+    limit=50,
+    database: "CliphistDatabase | None" = None,
+) -> Process | None:
+    if database is not None:
+        database.list_async(on_loaded, limit)
+        return None
+
+    history = []
+    pending = bytearray()
+
+    def add_line(line: bytes):
+        entry = parse_history_line(line.decode(errors="replace"))
+        if entry is not None:
+            history.append(entry)
+
+    def on_output(chunk: bytes):
+        pending.extend(chunk)
+        *lines, rest = pending.split(b"\n")
+        pending[:] = rest
+        for line in lines:
+            add_line(line)
+            if len(history) >= limit:
+                return False
+
+    def on_done(returncode: int, _):
+        if len(history) >= limit:
+            on_loaded(history[:limit])
+            return
+        if pending:
+            add_line(bytes(pending))
+        on_loaded(history if returncode == 0 else None)
+
+    return spawn(["cliphist", "list"], on_done=on_done, on_output=on_output)
+
+
+def get_database_path() -> Path:
+    path = os.environ.get("CLIPHIST_DB_PATH")
+    if path:
+        return Path(path)
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "cliphist" / "db"
+
+
+def content_hash(data: bytes | memoryview) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def format_size(size: int) -> str:
+    value = float(size)
+    units = ("B", "KiB", "MiB")
+    unit = 0
+    while value >= 1024 and unit < len(units) - 1:
+        value /= 1024
+        unit += 1
+    return f"{value:.0f} {units[unit]}"
+
+
+def image_info(data: bytes | memoryview) -> tuple[str, int, int] | None:
+    header = bytes(data[:32])
+    if header.startswith(b"\x89PNG\r\n\x1a\n") and len(header) >= 24:
+        width, height = struct.unpack(">II", header[16:24])
+        return "png", width, height
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        width, height = struct.unpack("<HH", header[6:10])
+        return "gif", width, height
+    if header.startswith(b"BM") and len(header) >= 26:
+        width, height = struct.unpack("<ii", header[18:26])
+        return "bmp", width, abs(height)
+    if header.startswith(b"RIFF") and header[8:12] == b"WEBP":
+        chunk = header[12:16]
+        if chunk == b"VP8X":
+            width = int.from_bytes(header[24:27], "little") + 1
+            height = int.from_bytes(header[27:30], "little") + 1
+            return "webp", width, height
+        if chunk == b"VP8L":
+            bits = int.from_bytes(header[21:25], "little")
+            return "webp", (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b"VP8 ":
+            width, height = struct.unpack("<HH", header[26:30])
+            return "webp", width & 0x3FFF, height & 0x3FFF
+        return None
+    if header.startswith(b"\xff\xd8"):
+        return jpeg_info(data)
+    return None
+
+
+def jpeg_info(data: bytes | memoryview) -> tuple[str, int, int] | None:
+    offset = 2
+    while offset + 9 <= len(data):
+        if data[offset] != 0xFF:
+            return None
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            offset += 2
+            continue
+        length = struct.unpack_from(">H", data, offset + 2)[0]
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack_from(">HH", data, offset + 5)
+            return "jpeg", width, height
+        offset += 2 + length
+    return None
+
+
+def preview_text(data: bytes | memoryview, width: int = 100) -> str:
+    info = image_info(data)
+    if info is not None:
+        image_format, image_width, image_height = info
+        return f"[[ binary data {format_size(len(data))} {image_format} {image_width}x{image_height} ]]"
+    text = " ".join(bytes(data[:PREVIEW_SCAN_BYTES]).decode(errors="replace").split())
+    if len(text) > width:
+        return text[:width] + "…"
+    return text
+
+
+class CliphistDatabase:
+    def __init__(self, path: str | os.PathLike | None = None, preview_width: int = 100):
+        self.path = Path(path) if path is not None else get_database_path()
+        self.preview_width = preview_width
+        self._monitor = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cliphist-database")
+
+    def list_async(self, on_loaded: HistoryCallback, limit=50):
+        def load():
+            history = self.list(limit)
+            GLib.idle_add(lambda: on_loaded(history) and False)
+
+        self._executor.submit(load)
+
+    # The database lock blocks cliphist from storing new entries, so the
+    # values are only copied out under it and summarized after release.
+    def list(self, limit=50) -> list[dict] | None:
+        try:
+            with BoltDB(self.path) as db:
+                bucket = db.bucket(CLIPHIST_BUCKET)
+                if bucket is None:
+                    return []
+                values = []
+                for key, value in bucket.items(reverse=True):
+                    values.append((int.from_bytes(key, "big"), bytes(value)))
+                    del value
+                    if len(values) >= limit:
+                        break
+        except (OSError, BoltError):
+            return None
+        values.reverse()
         history = []
-        for line in lines[:limit]:
-            idx, raw = line.split("\t", 1)
+        while values:
+            key, value = values.pop()
+            raw = preview_text(value, self.preview_width)
             history.append({
-                "id": idx,
+                "id": str(key),
                 "raw": raw,
-                "is_binary": "[[ binary data" in raw,
+                "is_binary": raw.startswith("[[ binary data"),
+                "size": len(value),
+                "hash": content_hash(value),
             })
         return history
-    return []
+
+    def decode(self, buffer_id: str) -> bytes | None:
+        try:
+            key = int(buffer_id).to_bytes(8, "big")
+            with BoltDB(self.path) as db:
+                bucket = db.bucket(CLIPHIST_BUCKET)
+                value = bucket.get(key) if bucket is not None else None
+                return bytes(value) if value is not None else None
+        except (ValueError, OverflowError, OSError, BoltError):
+            return None
+
+    def watch(self, callback: Callable[[], None]):
+        if self._monitor is not None:
+            self._monitor.cancel()
+
+        def on_changed(monitor, file, other_file, event_type):
+            if event_type in (
+                Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+                Gio.FileMonitorEvent.CREATED,
+                Gio.FileMonitorEvent.DELETED,
+            ):
+                callback()
+
+        self._monitor = Gio.File.new_for_path(str(self.path)).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self._monitor.connect("changed", on_changed)
+        return self._monitor
@@ -0,0 +1,351 @@
+import heapq
+import re
+import subprocess
+import time
+from array import array
+from bisect import bisect_left, insort
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Hashable, Iterable
+
+from gi.repository import GLib
+
+from utils.clipboard_history import CliphistDatabase, get_clipboard_history
+from utils.clipboard_watcher import ClipboardEntry
+from utils.query_engine import QueryMemo
+from utils.search_index import FUZZY_MIN_OVERLAP, get_trigrams
+
+TOKEN = re.compile(r"\w+")
+
+EXACT_WEIGHT = 2.0
+PREFIX_WEIGHT = 1.0
+FUZZY_WEIGHT = 0.5
+
+MAX_TEXT_LENGTH = 4096
+BATCH_SIZE = 200
+APPLY_BUDGET = 0.004
+NOTIFY_INTERVAL = 0.5
+
+
+def highlight_spans(text: str, terms: Iterable[str]) -> list[tuple[int, int]]:
+    terms = sorted(set(terms), key=len, reverse=True)
+    if not terms:
+        return []
+    spans = []
+    for match in TOKEN.finditer(text):
+        word = match.group().casefold()
+        for term in terms:
+            if word.startswith(term):
+                spans.append((match.start(), match.start() + min(len(term), len(match.group()))))
+                break
+    return spans
+
+
+def snippet(text: str, spans: list[tuple[int, int]], width: int = 100) -> tuple[str, list[tuple[int, int]]]:
+    if not spans or spans[0][1] <= width:
+        start = 0
+    else:
+        start = max(0, spans[0][0] - width // 4)
+    end = start + width
+    window = text[start:end]
+    prefix = "…" if start else ""
+    shift = len(prefix) - start
+    visible = [(begin + shift, finish + shift) for begin, finish in spans if begin >= start and finish <= end]
+    return prefix + window + ("…" if end < len(text) else ""), visible
+
+
+def entry_rank(buffer_id: str) -> int:
+    return int(buffer_id) if buffer_id.isdigit() else 0
+
+
+def tokenize(text: str) -> tuple[str, ...]:
+    return tuple(set(TOKEN.findall(text.casefold())))
+
+
+class TokenIndex:
+    def __init__(self, memo_size: int = 32):
+        self._slots: dict[Hashable, int] = {}
+        self._keys: list[Hashable | None] = []
+        self._ranks: list[int] = []
+        self._words: list[tuple[str, ...]] = []
+        self._postings: dict[str, array] = {}
+        self._vocabulary: list[str] = []
+        self._word_trigrams: dict[str, set[str]] = {}
+        self._memo = QueryMemo(memo_size)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._slots
+
+    def add(self, key: Hashable, text: str, rank: int = 0):
+        self.add_words(key, tokenize(text), rank)
+
+    def add_words(self, key: Hashable, words: tuple[str, ...], rank: int = 0):
+        self.remove(key)
+        slot = len(self._keys)
+        self._slots[key] = slot
+        self._keys.append(key)
+        self._ranks.append(rank)
+        self._words.append(words)
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = array("I")
+                self._add_word(word)
+            postings.append(slot)
+        self._memo.clear()
+
+    def remove(self, key: Hashable):
+        slot = self._slots.pop(key, None)
+        if slot is None:
+            return
+        self._keys[slot] = None
+        self._memo.clear()
+        if len(self._keys) > 2 * len(self._slots) + 64:
+            self._compact()
+
+    def search(self, query: str) -> tuple[list[Hashable], frozenset[str]]:
+        tokens = list(dict.fromkeys(TOKEN.findall(query.casefold())))
+        if not tokens:
+            slots = sorted(self._slots.values(), key=self._ranks.__getitem__, reverse=True)
+            return [self._keys[slot] for slot in slots], frozenset()
+
+        normalized = " ".join(tokens)
+        cached = self._memo.get(normalized)
+        if cached is not None:
+            return cached
+
+        matched = set()
+        scores = None
+        for token in sorted(tokens, key=len, reverse=True):
+            token_scores = self._match_token(token, matched)
+            if scores is None:
+                scores = token_scores
+            else:
+                if len(token_scores) < len(scores):
+                    scores, token_scores = token_scores, scores
+                scores = {slot: score + token_scores[slot] for slot, score in scores.items() if slot in token_scores}
+            if not scores:
+                break
+
+        keys = self._keys
+        slots = sorted(
+            (slot for slot in scores if keys[slot] is not None),
+            key=self._ranks.__getitem__,
+            reverse=True,
+        )
+        slots.sort(key=scores.__getitem__, reverse=True)
+        result = ([keys[slot] for slot in slots], frozenset(matched))
+        self._memo.put(normalized, result)
+        return result
+
+    def _match_token(self, token: str, matched: set[str]) -> dict[int, float]:
+        vocabulary = self._vocabulary
+        start = index = bisect_left(vocabulary, token)
+        while index < len(vocabulary) and vocabulary[index].startswith(token):
+            index += 1
+        words = vocabulary[start:index]
+
+        if words:
+            matched.add(token)
+            weight = PREFIX_WEIGHT
+        elif len(token) >= 3:
+            words = self._fuzzy_words(token)
+            matched.update(words)
+            weight = FUZZY_WEIGHT
+        else:
+            return {}
+
+        slots = set()
+        for word in words:
+            slots.update(self._postings[word])
+        scores = dict.fromkeys(slots, weight)
+        exact = self._postings.get(token)
+        if exact is not None:
+            scores.update(dict.fromkeys(exact, EXACT_WEIGHT))
+        return scores
+
+    def _fuzzy_words(self, token: str) -> list[str]:
+        grams = get_trigrams(token)
+        counts: dict[str, int] = {}
+        for gram in grams:
+            for word in self._word_trigrams.get(gram, ()):
+                counts[word] = counts.get(word, 0) + 1
+        return [
+            word
+            for word, count in counts.items()
+            if count / max(len(grams), len(word) - 2) >= FUZZY_MIN_OVERLAP
+        ]
+
+    def _add_word(self, word: str):
+        insort(self._vocabulary, word)
+        for gram in get_trigrams(word):
+            self._word_trigrams.setdefault(gram, set()).add(word)
+
+    def _compact(self):
+        live = sorted(self._slots.items(), key=lambda item: item[1])
+        ranks = self._ranks
+        words = self._words
+        self._slots = {}
+        self._keys = []
+        self._ranks = []
+        self._words = []
+        self._postings = {}
+        self._vocabulary = []
+        self._word_trigrams = {}
+        for key, slot in live:
+            self.add_words(key, words[slot], ranks[slot])
+
+
+class ClipboardIndex:
+    def __init__(
+        self,
+        database: CliphistDatabase | None = None,
+        max_entries: int = 10000,
+        on_changed: Callable[[], None] | None = None,
+    ):
+        self.database = database
+        self.max_entries = max_entries
+        self.on_changed = on_changed
+        self.index = TokenIndex()
+        self.entries: dict[str, ClipboardEntry] = {}
+        self._texts: dict[str, str] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clipboard-index")
+        self._pending: deque[tuple[ClipboardEntry, str, tuple[str, ...]]] = deque()
+        self._apply_id = None
+        self._notified = 0.0
+        self._syncing = False
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def text(self, buffer_id: str) -> str:
+        return self._texts.get(buffer_id, "")
+
+    def search(self, query: str) -> tuple[list[ClipboardEntry], frozenset[str]]:
+        keys, matched = self.index.search(query)
+        return [self.entries[key] for key in keys], matched
+
+    def sync(self):
+        if self._syncing:
+            return
+        self._syncing = True
+        self._executor.submit(self._sync, set(self.entries))
+
+    # `entries` is the newest part of the history. Ids inside the range it
+    # covers that it no longer lists were deleted; a complete list (shorter
+    # than what was asked for) also drops everything older. Ids newer than
+    # the list arrived after it was read and are kept.
+    def update(self, entries: list[ClipboardEntry], complete: bool = False):
+        live = {entry.id for entry in entries}
+        oldest = None
+        if not complete:
+            oldest = min((int(buffer_id) for buffer_id in live if buffer_id.isdigit()), default=None)
+            if oldest is None:
+                self.add_entries(entries)
+                return
+        self._prune(live, oldest)
+        self.add_entries(entries)
+
+    def add_entries(self, entries: Iterable[ClipboardEntry]):
+        missing = [entry for entry in entries if entry.id not in self.entries]
+        if missing:
+            self._executor.submit(self._decode_batch, missing)
+
+    def _sync(self, known: set[str]):
+        try:
+            if self.database is not None:
+                history = self.database.list(self.max_entries)
+            else:
+                history = get_clipboard_history(limit=self.max_entries)
+            if history is None:
+                return
+            entries = [ClipboardEntry.from_history(item) for item in history]
+            oldest = None
+            if len(entries) >= self.max_entries:
+                oldest = min((int(entry.id) for entry in entries if entry.id.isdigit()), default=None)
+            GLib.idle_add(self._prune, {entry.id for entry in entries}, oldest)
+            self._decode_batch([entry for entry in entries if entry.id not in known])
+        finally:
+            GLib.idle_add(self._sync_done)
+
+    def _decode_batch(self, entries: list[ClipboardEntry]):
+        batch = []
+        for entry in entries:
+            text = self._decode_text(entry)
+            batch.append((entry, text, tokenize(text)))
+            if len(batch) >= BATCH_SIZE:
+                GLib.idle_add(self._queue, batch)
+                batch = []
+        if batch:
+            GLib.idle_add(self._queue, batch)
+
+    def _decode_text(self, entry: ClipboardEntry) -> str:
+        if entry.is_binary or not entry.preview.endswith("…"):
+            return entry.preview
+        if self.database is not None:
+            data = self.database.decode(entry.id)
+        else:
+            try:
+                data = subprocess.run(["cliphist", "decode", entry.id], capture_output=True, timeout=5).stdout
+            except (OSError, subprocess.SubprocessError):
+                data = None
+        if not data:
+            return entry.preview
+        return data[:MAX_TEXT_LENGTH * 4].decode(errors="replace")[:MAX_TEXT_LENGTH]
+
+    def _queue(self, batch: list[tuple[ClipboardEntry, str, tuple[str, ...]]]):
+        self._pending.extend(batch)
+        if self._apply_id is None:
+            self._apply_id = GLib.idle_add(self._apply, priority=GLib.PRIORITY_LOW)
+        return False
+
+    def _apply(self):
+        deadline = time.perf_counter() + APPLY_BUDGET
+        while self._pending and time.perf_counter() < deadline:
+            entry, text, words = self._pending.popleft()
+            self.entries[entry.id] = entry
+            self._texts[entry.id] = text
+            self.index.add_words(entry.id, words, entry_rank(entry.id))
+        if len(self.entries) > self.max_entries:
+            self._remove(heapq.nsmallest(len(self.entries) - self.max_entries, self.entries, key=entry_rank))
+
+        now = time.perf_counter()
+        if self.on_changed is not None and (not self._pending or now - self._notified > NOTIFY_INTERVAL):
+            self._notified = now
+            self.on_changed()
+        if self._pending:
+            return True
+        self._apply_id = None
+        return False
+
+    def _prune(self, live: set[str], oldest: int | None = None):
+        newest = max((int(buffer_id) for buffer_id in live if buffer_id.isdigit()), default=None)
+
+        def deleted(buffer_id: str) -> bool:
+            if buffer_id in live:
+                return False
+            if not buffer_id.isdigit():
+                return True
+            rank = int(buffer_id)
+            return (oldest is None or rank >= oldest) and (newest is None or rank <= newest)
+
+        if any(deleted(entry.id) for entry, _, _ in self._pending):
+            self._pending = deque(item for item in self._pending if not deleted(item[0].id))
+        removed = [buffer_id for buffer_id in self.entries if deleted(buffer_id)]
+        self._remove(removed)
+        if removed and self.on_changed is not None:
+            self.on_changed()
+        return False
+
+    def _remove(self, buffer_ids: Iterable[str]):
+        for buffer_id in buffer_ids:
+            del self.entries[buffer_id]
+            del self._texts[buffer_id]
+            self.index.remove(buffer_id)
+
+    def _sync_done(self):
+        self._syncing = False
+        return False
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from gi.repository import GLib
+
+from utils.clipboard_history import CliphistDatabase
+from utils.lru import LRUCache
+from utils.process import spawn
+
+PayloadCallback = Callable[[bytes | None], None]
+
+
+class ClipboardPayloads:
+    def __init__(self, database: CliphistDatabase | None = None, max_bytes: int = 64 * 1024 * 1024):
+        self.database = database
+        self._cache = LRUCache(max_bytes, len)
+        self._pending: dict[str, list[PayloadCallback]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="clipboard-payloads")
+
+    def get(self, buffer_id: str) -> bytes | None:
+        return self._cache.get(buffer_id)
+
+    def put(self, buffer_id: str, data: bytes):
+        self._cache.put(buffer_id, data)
+
+    def request(self, buffer_id: str, callback: PayloadCallback | None = None):
+        data = self._cache.get(buffer_id)
+        if data is not None:
+            if callback is not None:
+                callback(data)
+            return
+
+        callbacks = self._pending.get(buffer_id)
+        if callbacks is None:
+            callbacks = self._pending[buffer_id] = []
+            if self.database is not None:
+                self._executor.submit(self._read_database, buffer_id)
+            else:
+                spawn(
+                    ["cliphist", "decode", buffer_id],
+                    on_done=lambda returncode, data: self._deliver(buffer_id, data if returncode == 0 else None),
+                    capture_output=True,
+                )
+        if callback is not None:
+            callbacks.append(callback)
+
+    def _read_database(self, buffer_id: str):
+        GLib.idle_add(self._deliver, buffer_id, self.database.decode(buffer_id))
+
+    def _deliver(self, buffer_id: str, data: bytes | None):
+        if data:
+            self._cache.put(buffer_id, data)
+        for callback in self._pending.pop(buffer_id, ()):
+            callback(data or None)
+        return False
@@ -0,0 +1,199 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from gi.repository import GdkPixbuf, GLib
+
+from utils.clipboard_history import content_hash, image_info
+from utils.clipboard_payloads import ClipboardPayloads
+from utils.lru import LRUCache
+from utils.path import get_cache_path
+
+INDEX_VERSION = 1
+MAX_ENTRIES = 500
+SAVE_DELAY = 1000
+
+ThumbnailCallback = Callable[[GdkPixbuf.Pixbuf | None], None]
+
+
+def scale_to_height(pixbuf: GdkPixbuf.Pixbuf, height: int) -> GdkPixbuf.Pixbuf:
+    if pixbuf.get_height() <= height:
+        return pixbuf
+    width = max(1, round(pixbuf.get_width() * height / pixbuf.get_height()))
+    return pixbuf.scale_simple(width, height, GdkPixbuf.InterpType.BILINEAR)
+
+
+class ClipboardThumbnails:
+    def __init__(
+        self,
+        height: int = 80,
+        max_bytes: int = 8 * 1024 * 1024,
+        payloads: ClipboardPayloads | None = None,
+        workers: int = 2,
+    ):
+        self.height = height
+        self.payloads = payloads if payloads is not None else ClipboardPayloads()
+        self.directory = get_cache_path() / "clipboard-thumbnails"
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.index_file = self.directory / "index.json"
+        self._index: dict[str, str | None] = {}
+        self._cache = LRUCache(max_bytes, lambda pixbuf: pixbuf.get_byte_length())
+        self._pending: dict[str, list[ThumbnailCallback]] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clipboard-thumbnails")
+        self._save_id = None
+        self._load_index()
+
+    def request(self, buffer_id: str, callback: ThumbnailCallback):
+        if buffer_id in self._index:
+            digest = self._index[buffer_id]
+            pixbuf = self._cache.get(digest) if digest is not None else None
+            if pixbuf is not None or digest is None:
+                callback(pixbuf)
+                return
+
+        callbacks = self._pending.get(buffer_id)
+        if callbacks is None:
+            callbacks = self._pending[buffer_id] = []
+            digest = self._index.get(buffer_id)
+            if digest is not None:
+                self._executor.submit(self._load_cached, buffer_id, digest)
+            else:
+                self._fetch(buffer_id)
+        callbacks.append(callback)
+
+    def prune(self, buffer_ids: Iterable[str]):
+        live = set(buffer_ids)
+        oldest = min((int(buffer_id) for buffer_id in live if buffer_id.isdigit()), default=None)
+
+        def deleted(buffer_id: str) -> bool:
+            if buffer_id in live:
+                return False
+            return oldest is None or not buffer_id.isdigit() or int(buffer_id) >= oldest
+
+        index = {buffer_id: digest for buffer_id, digest in self._index.items() if not deleted(buffer_id)}
+        if len(index) > MAX_ENTRIES:
+            kept = sorted(index, key=lambda buffer_id: int(buffer_id) if buffer_id.isdigit() else 0)
+            index = {buffer_id: index[buffer_id] for buffer_id in kept[-MAX_ENTRIES:]}
+        if index == self._index:
+            return
+
+        self._index = index
+        referenced = set(index.values())
+        for digest in list(self._cache):
+            if digest not in referenced:
+                self._cache.pop(digest)
+        for path in self.directory.glob("*.png"):
+            if path.stem not in referenced:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+        self._queue_save_index()
+
+    def _fetch(self, buffer_id: str):
+        self.payloads.request(buffer_id, lambda data: self._on_payload(buffer_id, data))
+
+    def _on_payload(self, buffer_id: str, data: bytes | None):
+        if data is None:
+            self._deliver(buffer_id, None, None, False)
+            return
+        self._executor.submit(self._process, buffer_id, data)
+
+    def _load_cached(self, buffer_id: str, digest: str):
+        pixbuf = self._read_file(digest)
+        if pixbuf is None:
+            GLib.idle_add(self._refetch, buffer_id)
+            return
+        GLib.idle_add(self._deliver, buffer_id, digest, pixbuf, False)
+
+    def _refetch(self, buffer_id: str):
+        self._index.pop(buffer_id, None)
+        self._fetch(buffer_id)
+        return False
+
+    def _process(self, buffer_id: str, data: bytes):
+        digest = None
+        pixbuf = None
+        if image_info(data) is not None:
+            digest = content_hash(data)
+            pixbuf = self._read_file(digest)
+            if pixbuf is None:
+                pixbuf = self._decode(data)
+                if pixbuf is None:
+                    digest = None
+                else:
+                    self._save_file(digest, pixbuf)
+        GLib.idle_add(self._deliver, buffer_id, digest, pixbuf, True)
+
+    def _deliver(self, buffer_id: str, digest: str | None, pixbuf: GdkPixbuf.Pixbuf | None, record: bool):
+        if pixbuf is not None:
+            self._cache.put(digest, pixbuf)
+        if record:
+            self._index[buffer_id] = digest
+            self._queue_save_index()
+        for callback in self._pending.pop(buffer_id, ()):
+            callback(pixbuf)
+        return False
+
+    def _decode(self, data: bytes) -> GdkPixbuf.Pixbuf | None:
+        def on_size_prepared(loader, width, height):
+            if height > self.height:
+                loader.set_size(max(1, round(width * self.height / height)), self.height)
+
+        loader = GdkPixbuf.PixbufLoader.new()
+        loader.connect("size-prepared", on_size_prepared)
+        try:
+            loader.write(data)
+            loader.close()
+        except GLib.Error:
+            return None
+        pixbuf = loader.get_pixbuf()
+        if pixbuf is None:
+            return None
+        return scale_to_height(pixbuf, self.height)
+
+    def _read_file(self, digest: str) -> GdkPixbuf.Pixbuf | None:
+        try:
+            return GdkPixbuf.Pixbuf.new_from_file(str(self.directory / f"{digest}.png"))
+        except GLib.Error:
+            return None
+
+    def _save_file(self, digest: str, pixbuf: GdkPixbuf.Pixbuf):
+        path = self.directory / f"{digest}.png"
+        temp_file = path.with_name(f"{digest}.{threading.get_native_id()}.tmp")
+        try:
+            pixbuf.savev(str(temp_file), "png", [], [])
+            os.replace(temp_file, path)
+        except (GLib.Error, OSError):
+            import traceback
+            traceback.print_exc()
+
+    def _load_index(self):
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        if data.get("version") == INDEX_VERSION and data.get("height") == self.height:
+            self._index = data.get("entries", {})
+
+    # A page of new thumbnails arrives one by one; write the index once
+    # they settle instead of once per image.
+    def _queue_save_index(self, delay: int = SAVE_DELAY):
+        if self._save_id is None:
+            self._save_id = GLib.timeout_add(delay, self._save_index)
+
+    def _save_index(self):
+        self._save_id = None
+        data = {"version": INDEX_VERSION, "height": self.height, "entries": self._index}
+        temp_file = self.index_file.with_suffix(".tmp")
+        try:
+            with open(temp_file, "w") as f:
+                json.dump(data, f)
+            os.replace(temp_file, self.index_file)
+        except OSError:
+            import traceback
+            traceback.print_exc()
+        return False
@@ -0,0 +1,147 @@
+import re
+from collections import deque
+from typing import NamedTuple
+
+from gi.repository import GLib
+
+from fabric.core.service import Service, Signal
+
+from utils.clipboard_history import CliphistDatabase, content_hash, load_clipboard_history
+from utils.process import Process, spawn
+
+BINARY_PREVIEW = re.compile(r"\[\[ binary data (\d+) (B|KiB|MiB) (\w+)")
+UNIT_SIZES = {"B": 1, "KiB": 1024, "MiB": 1024 * 1024}
+
+
+class ClipboardEntry(NamedTuple):
+    id: str
+    preview: str
+    mime: str
+    hash: str
+    size: int
+
+    @property
+    def is_binary(self) -> bool:
+        return not self.mime.startswith("text/")
+
+    @classmethod
+    def from_history(cls, history: dict) -> "ClipboardEntry":
+        preview = history["raw"]
+        match = BINARY_PREVIEW.match(preview) if history["is_binary"] else None
+        if match is not None:
+            mime = f"image/{match.group(3)}"
+            size = history.get("size", int(match.group(1)) * UNIT_SIZES[match.group(2)])
+            digest = history.get("hash", "")
+        elif history["is_binary"]:
+            mime = "application/octet-stream"
+            size = history.get("size", 0)
+            digest = history.get("hash", "")
+        else:
+            mime = "text/plain"
+            size = history.get("size", len(preview.encode()))
+            digest = history.get("hash") or ("" if preview.endswith("…") else content_hash(preview.encode()))
+        return cls(history["id"], preview, mime, digest, size)
+
+
+class ClipboardWatcher(Service):
+    @Signal
+    def changed(self) -> None: ...
+
+    def __init__(
+        self,
+        capacity: int = 50,
+        database: CliphistDatabase | None = None,
+        debounce: int = 150,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.capacity = capacity
+        self.database = database
+        self.debounce = debounce
+        self._entries: deque[ClipboardEntry] = deque(maxlen=capacity)
+        self._process: Process | None = None
+        self._loading = False
+        self._reload = False
+        self._refresh_id = None
+        self._running = False
+
+    @property
+    def entries(self) -> list[ClipboardEntry]:
+        return list(self._entries)
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self.refresh()
+        if self.database is not None:
+            self.database.watch(self.queue_refresh)
+        else:
+            self._spawn_watch()
+
+    def stop(self):
+        self._running = False
+        if self._process is not None:
+            self._process.terminate()
+            self._process = None
+        if self._refresh_id is not None:
+            GLib.source_remove(self._refresh_id)
+            self._refresh_id = None
+
+    def queue_refresh(self):
+        if self._refresh_id is not None:
+            GLib.source_remove(self._refresh_id)
+
+        def refresh():
+            self._refresh_id = None
+            self.refresh()
+            return False
+
+        self._refresh_id = GLib.timeout_add(self.debounce, refresh)
+
+    def refresh(self):
+        if self._loading:
+            self._reload = True
+            return
+        self._loading = True
+        load_clipboard_history(self._on_loaded, limit=self.capacity, database=self.database)
+
+    def _spawn_watch(self):
+        def on_output(_):
+            self.queue_refresh()
+
+        def restart():
+            if self._running and self._process is None:
+                self._spawn_watch()
+            return False
+
+        def on_done(returncode, _):
+            self._process = None
+            if self._running and returncode != 127:
+                GLib.timeout_add_seconds(5, restart)
+
+        self._process = spawn(["wl-paste", "--watch", "echo"], on_done=on_done, on_output=on_output)
+
+    def _on_loaded(self, history: list[dict] | None):
+        self._loading = False
+        if history is not None:
+            self._merge(history)
+        if self._reload:
+            self._reload = False
+            self.refresh()
+
+    def _merge(self, history: list[dict]):
+        known = {entry.id: entry for entry in self._entries}
+        entries = deque(maxlen=self.capacity)
+        seen = set()
+        for item in history:
+            entry = known.get(item["id"]) or ClipboardEntry.from_history(item)
+            if entry.hash:
+                if entry.hash in seen:
+                    continue
+                seen.add(entry.hash)
+            entries.append(entry)
+
+        if list(entries) != list(self._entries):
+            self._entries = entries
+            self.changed()
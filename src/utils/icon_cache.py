@@ -0,0 +1,158 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable
+
+from gi.repository import Gdk, GdkPixbuf, Gio, GLib, Gtk
+
+from utils.lru import LRUCache
+from utils.path import get_root_path
+
+DEFAULT_ICON = str(get_root_path() / "icons" / "default.png")
+
+IconKey = tuple[str, int, int]
+
+
+def get_icon_source(entry) -> str | None:
+    return getattr(entry, "icon_path", None) or getattr(entry, "icon_name", None)
+
+
+def set_image_pixbuf(image: Gtk.Image, pixbuf: GdkPixbuf.Pixbuf | None, scale: int = 1):
+    if pixbuf is not None and scale > 1:
+        surface = Gdk.cairo_surface_create_from_pixbuf(pixbuf, scale, image.get_window())
+        image.set_from_surface(surface)
+    else:
+        image.set_from_pixbuf(pixbuf)
+
+
+class IconCache:
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, workers: int = 2):
+        self._cache = LRUCache(max_bytes, lambda pixbuf: pixbuf.get_byte_length())
+        self._pending: dict[IconKey, list[Callable]] = {}
+        self._filenames: dict[IconKey, str | None] = {}
+        self._missing: set[IconKey] = set()
+        self._theme = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="icon-cache")
+
+    def lookup(self, source: str | None, size: int, scale: int = 1) -> GdkPixbuf.Pixbuf | None:
+        key = (source or DEFAULT_ICON, size, scale)
+        if key in self._missing:
+            return self.placeholder(size, scale)
+        return self._cache.get(key)
+
+    def load(self, source: str | None, size: int, scale: int = 1) -> GdkPixbuf.Pixbuf | None:
+        key = (source or DEFAULT_ICON, size, scale)
+        if key in self._missing:
+            return None
+        pixbuf = self._cache.get(key)
+        if pixbuf is None:
+            pixbuf = self._decode(self._resolve(key[0], size, scale), size * scale)
+            if pixbuf is None:
+                self._missing.add(key)
+            else:
+                self._cache.put(key, pixbuf)
+        return pixbuf
+
+    def placeholder(self, size: int, scale: int = 1) -> GdkPixbuf.Pixbuf | None:
+        return self.load(DEFAULT_ICON, size, scale)
+
+    def request(self, source: str | None, size: int, scale: int = 1, callback: Callable | None = None):
+        key = (source or DEFAULT_ICON, size, scale)
+        pixbuf = self.lookup(source, size, scale)
+        if pixbuf is not None or key in self._missing:
+            if callback is not None:
+                callback(pixbuf)
+            return
+
+        callbacks = self._pending.get(key)
+        if callbacks is None:
+            callbacks = self._pending[key] = []
+            filename = self._resolve(key[0], size, scale)
+            self._executor.submit(self._decode_async, key, filename)
+        if callback is not None:
+            callbacks.append(callback)
+
+    def bind(self, image: Gtk.Image, source: str | None, size: int):
+        scale = image.get_scale_factor()
+        image._icon_source = source
+
+        def on_loaded(pixbuf):
+            if image._icon_source == source:
+                set_image_pixbuf(image, pixbuf, scale)
+
+        pixbuf = self.lookup(source, size, scale)
+        if pixbuf is None:
+            set_image_pixbuf(image, self.placeholder(size, scale), scale)
+            self.request(source, size, scale, on_loaded)
+        else:
+            set_image_pixbuf(image, pixbuf, scale)
+
+    def warm(self, sources: Iterable[str | None], size: int, scale: int = 1, batch: int = 8):
+        self._idle_batches(sources, lambda source: self.request(source, size, scale), batch)
+
+    def warm_lookups(self, sources: Iterable[str | None], size: int, scale: int = 1, batch: int = 32):
+        self._idle_batches(sources, lambda source: self._resolve(source or DEFAULT_ICON, size, scale), batch)
+
+    def _idle_batches(self, sources: Iterable[str | None], handle: Callable, batch: int):
+        sources = iter(sources)
+
+        def run_batch():
+            for _ in range(batch):
+                source = next(sources, StopIteration)
+                if source is StopIteration:
+                    return False
+                handle(source)
+            return True
+
+        GLib.idle_add(run_batch, priority=GLib.PRIORITY_LOW)
+
+    # Gtk.IconTheme is main-thread only, so lookups are remembered per icon
+    # name until the theme changes instead of being repeated on every bind.
+    def _resolve(self, source: str, size: int, scale: int) -> str | None:
+        key = (source, size, scale)
+        if key in self._filenames:
+            return self._filenames[key]
+        if os.path.isabs(source):
+            return source
+        if self._theme is None:
+            self._theme = Gtk.IconTheme.get_default()
+            self._theme.connect("changed", self._on_theme_changed)
+        try:
+            icon = Gio.Icon.new_for_string(source)
+        except GLib.Error:
+            self._filenames[key] = None
+            return None
+        info = self._theme.lookup_by_gicon_for_scale(icon, size, scale, Gtk.IconLookupFlags.FORCE_SIZE)
+        filename = info.get_filename() if info is not None else None
+        self._filenames[key] = filename
+        return filename
+
+    # Icons that failed to resolve or decode stay on the placeholder until
+    # the theme changes, rather than being decoded again on every bind.
+    def _on_theme_changed(self, *_):
+        self._filenames.clear()
+        self._missing.clear()
+
+    def _decode(self, filename: str | None, pixel_size: int) -> GdkPixbuf.Pixbuf | None:
+        if filename is None:
+            return None
+        try:
+            return GdkPixbuf.Pixbuf.new_from_file_at_size(filename, pixel_size, pixel_size)
+        except GLib.Error:
+            return None
+
+    def _decode_async(self, key: IconKey, filename: str | None):
+        pixbuf = self._decode(filename, key[1] * key[2])
+        GLib.idle_add(self._deliver, key, pixbuf)
+
+    def _deliver(self, key: IconKey, pixbuf: GdkPixbuf.Pixbuf | None):
+        if pixbuf is None:
+            self._missing.add(key)
+            pixbuf = self.placeholder(key[1], key[2])
+        else:
+            self._cache.put(key, pixbuf)
+        for callback in self._pending.pop(key, ()):
+            callback(pixbuf)
+        return False
+
+
+icon_cache = IconCache()
@@ -0,0 +1,50 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterator
+
+
+class LRUCache:
+    def __init__(self, max_bytes: int, sizeof: Callable[[Any], int]):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        self.pop(key)
+        size = self.sizeof(value)
+        self._entries[key] = (value, size)
+        self.total_bytes += size
+        self.trim()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return default
+        self.total_bytes -= entry[1]
+        return entry[0]
+
+    def trim(self, max_bytes: int | None = None):
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        while self.total_bytes > max_bytes and self._entries:
+            _, (_, size) = self._entries.popitem(last=False)
+            self.total_bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self.total_bytes = 0
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 
@@ -7,3 +8,15 @@ def get_root_path() -> Path:
 
 def get_path() -> Path:
     return get_root_path().parent
+
+
+def get_cache_path() -> Path:
+    path = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "exslauncher"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def get_state_path() -> Path:
+    path = Path(os.environ.get("XDG_STATE_HOME") or Path.home() / ".local" / "state") / "exslauncher"
+    path.mkdir(parents=True, exist_ok=True)
+    return path
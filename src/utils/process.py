@@ -0,0 +1,136 @@
+import os
+import shlex
+import signal
+from typing import Callable
+
+from gi.repository import GLib
+
+SHELL_CHARACTERS = frozenset("|&;<>()")
+SHELL_EXPANSIONS = frozenset("$`*?[~")
+
+ProcessCallback = Callable[[int, bytes | None], None]
+OutputCallback = Callable[[bytes], bool | None]
+
+
+def parse_command(command: str | list[str]) -> list[str]:
+    if not isinstance(command, str):
+        return list(command)
+    lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+    lexer.whitespace_split = True
+    argv = list(lexer)
+    needs_shell = any(set(arg) <= SHELL_CHARACTERS for arg in argv)
+    if needs_shell or SHELL_EXPANSIONS & set(command):
+        return ["/bin/sh", "-c", command]
+    return argv
+
+
+class Process:
+    def __init__(
+        self,
+        argv: list[str],
+        on_done: ProcessCallback | None = None,
+        capture_output: bool = False,
+        input: bytes | memoryview | None = None,
+        on_output: OutputCallback | None = None,
+    ):
+        self.argv = argv
+        self.on_done = on_done
+        self.on_output = on_output
+        self.returncode: int | None = None
+        self._chunks: list[bytes] | None = [] if capture_output else None
+        self._input = memoryview(input) if input is not None else None
+        self._open_streams = 0
+
+        flags = GLib.SpawnFlags.SEARCH_PATH | GLib.SpawnFlags.DO_NOT_REAP_CHILD
+        self.pid, stdin_fd, stdout_fd, _ = GLib.spawn_async(
+            argv,
+            flags=flags,
+            standard_input=input is not None,
+            standard_output=capture_output or on_output is not None,
+        )
+
+        GLib.child_watch_add(GLib.PRIORITY_DEFAULT, self.pid, self._on_exit)
+        if stdout_fd is not None:
+            self._watch(stdout_fd, GLib.IOCondition.IN, self._on_stdout)
+        if stdin_fd is not None:
+            self._watch(stdin_fd, GLib.IOCondition.OUT, self._on_stdin)
+
+    def _watch(self, fd: int, condition: GLib.IOCondition, callback):
+        os.set_blocking(fd, False)
+        self._open_streams += 1
+        GLib.unix_fd_add_full(
+            GLib.PRIORITY_DEFAULT,
+            fd,
+            condition | GLib.IOCondition.HUP | GLib.IOCondition.ERR,
+            callback,
+        )
+
+    def _close(self, fd: int) -> bool:
+        os.close(fd)
+        self._open_streams -= 1
+        self._finish()
+        return GLib.SOURCE_REMOVE
+
+    def _on_stdout(self, fd: int, condition: GLib.IOCondition):
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return GLib.SOURCE_CONTINUE
+        except OSError:
+            data = b""
+        if not data:
+            return self._close(fd)
+        if self._chunks is not None:
+            self._chunks.append(data)
+        if self.on_output is not None and self.on_output(data) is False:
+            self.terminate()
+            return self._close(fd)
+        return GLib.SOURCE_CONTINUE
+
+    def _on_stdin(self, fd: int, condition: GLib.IOCondition):
+        try:
+            written = os.write(fd, self._input[:65536])
+        except BlockingIOError:
+            return GLib.SOURCE_CONTINUE
+        except OSError:
+            written = len(self._input)
+        self._input = self._input[written:]
+        if not self._input:
+            return self._close(fd)
+        return GLib.SOURCE_CONTINUE
+
+    def terminate(self):
+        if self.returncode is None:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _on_exit(self, pid: int, status: int):
+        GLib.spawn_close_pid(pid)
+        self.returncode = os.waitstatus_to_exitcode(status)
+        self._finish()
+
+    def _finish(self):
+        if self.returncode is None or self._open_streams:
+            return
+        if self.on_done is not None:
+            stdout = b"".join(self._chunks) if self._chunks is not None else None
+            self.on_done(self.returncode, stdout)
+
+
+def spawn(
+    argv: str | list[str],
+    on_done: ProcessCallback | None = None,
+    capture_output: bool = False,
+    input: bytes | memoryview | None = None,
+    on_output: OutputCallback | None = None,
+) -> Process | None:
+    try:
+        return Process(parse_command(argv), on_done, capture_output, input, on_output)
+    except GLib.Error:
+        import traceback
+        traceback.print_exc()
+        if on_done is not None:
+            GLib.idle_add(lambda: on_done(127, b"" if capture_output else None) and False)
+        return None
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from typing import Any, Callable, Iterable
+
+
+class QueryMemo:
+    def __init__(self, size: int = 32):
+        self.size = size
+        self._entries: OrderedDict[str, Any] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str) -> Any:
+        results = self._entries.get(query)
+        if results is not None:
+            self._entries.move_to_end(query)
+        return results
+
+    def put(self, query: str, results: Any):
+        self._entries[query] = results
+        self._entries.move_to_end(query)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def find_base(self, query: str, narrows: Callable[[str, str], bool]) -> Any:
+        best = None
+        for previous, results in self._entries.items():
+            if previous != query and narrows(previous, query):
+                if best is None or len(results) < len(best):
+                    best = results
+        return best
+
+    def clear(self):
+        self._entries.clear()
+
+
+class QueryEngine:
+    def __init__(
+        self,
+        items: Iterable[Any] = (),
+        haystack: Callable[[Any], str] = str,
+        memo_size: int = 32,
+    ):
+        self.haystack = haystack
+        self.memo = QueryMemo(memo_size)
+        self.set_items(items)
+
+    def set_items(self, items: Iterable[Any]):
+        self.items = list(items)
+        self._haystacks = [self.haystack(item).casefold() for item in self.items]
+        self.memo.clear()
+
+    def search(self, query: str) -> list[Any]:
+        query = query.casefold()
+        if not query:
+            return list(self.items)
+
+        matches = self.memo.get(query)
+        if matches is None:
+            base = self.memo.find_base(query, lambda previous, current: previous in current)
+            candidates = range(len(self.items)) if base is None else base
+            haystacks = self._haystacks
+            matches = [index for index in candidates if query in haystacks[index]]
+            self.memo.put(query, matches)
+        return [self.items[index] for index in matches]
@@ -0,0 +1,398 @@
+import heapq
+from bisect import bisect_left
+from collections import Counter
+from itertools import islice
+from typing import Any, Callable, Iterable
+
+from utils.query_engine import QueryMemo
+
+WORD_SEPARATORS = frozenset(" -_./:()[],+")
+
+FIELD_WEIGHTS = (3.0, 2.0, 1.0)
+
+EXACT_BONUS = 2.5
+START_BONUS = 2.0
+WORD_BONUS = 1.5
+
+# Every substring of up to GRAM_LENGTH characters is indexed with the
+# best score it gets in an item, so short tokens are answered straight
+# from the table and longer ones walk their leading gram.
+GRAM_LENGTH = 3
+
+FUZZY_WEIGHT = 0.8
+FUZZY_MIN_OVERLAP = 0.5
+FUZZY_MIN_RESULTS = 10
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.casefold().split())
+
+
+def get_trigrams(text: str) -> set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def desktop_entry_fields(entry) -> tuple[str, str, str]:
+    names = (entry.display_name, entry.name, getattr(entry, "generic_name", None))
+    name = " ".join(dict.fromkeys(filter(None, names)))
+
+    keywords = getattr(entry, "keywords", None)
+    if keywords is None and getattr(entry, "_app", None) is not None:
+        keywords = entry._app.get_keywords()
+    keywords = list(keywords or ())
+    executable = getattr(entry, "executable", None)
+    if executable:
+        keywords.append(executable.rsplit("/", 1)[-1])
+
+    return name, entry.description or "", " ".join(keywords)
+
+
+def field_score(haystack: str, token: str, weight: float) -> float:
+    position = haystack.find(token)
+    if position < 0:
+        return 0.0
+    if position == 0:
+        return weight * (EXACT_BONUS if len(token) == len(haystack) else START_BONUS)
+    while position >= 0:
+        if haystack[position - 1] in WORD_SEPARATORS:
+            return weight * WORD_BONUS
+        position = haystack.find(token, position + 1)
+    return weight
+
+
+def gram_scores(haystacks: tuple[str, ...], weights: tuple[float, ...]) -> dict[str, float]:
+    best = {}
+    for haystack, weight in zip(haystacks, weights):
+        length = len(haystack)
+        for position in range(length):
+            if haystack[position] == " ":
+                continue
+            if position == 0:
+                score = weight * START_BONUS
+            elif haystack[position - 1] in WORD_SEPARATORS:
+                score = weight * WORD_BONUS
+            else:
+                score = weight
+            for end in range(position + 1, min(position + GRAM_LENGTH, length) + 1):
+                gram = haystack[position:end]
+                if gram[-1] == " ":
+                    break
+                gram_score = weight * EXACT_BONUS if end == length and position == 0 else score
+                if gram_score > best.get(gram, 0.0):
+                    best[gram] = gram_score
+    return best
+
+
+class SearchIndex:
+    def __init__(
+        self,
+        items: Iterable[Any] = (),
+        fields: Callable[[Any], tuple[str, ...]] = desktop_entry_fields,
+        weights: tuple[float, ...] = FIELD_WEIGHTS,
+        key: Callable[[Any], Any] = id,
+    ):
+        self.fields = fields
+        self.weights = weights
+        self.key = key
+        self._slots: dict[Any, int] = {}
+        self._items: list[Any] = []
+        self._haystacks: list[tuple[str, ...]] = []
+        self._texts: list[str] = []
+        # gram -> score -> slots in ascending order, so walking the buckets
+        # from the best score down yields matches already ranked.
+        self._grams: dict[str, dict[float, list[int]]] = {}
+        self._exact: dict[str, list[int]] = {}
+        self._memo = QueryMemo()
+        self._gram_maps = QueryMemo()
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, item) -> bool:
+        return self.key(item) in self._slots
+
+    @property
+    def items(self) -> list[Any]:
+        return [item for item in self._items if item is not None]
+
+    def extend(self, items: Iterable[Any]):
+        for item in items:
+            self.add(item)
+
+    def add(self, item) -> int:
+        self.remove(item)
+        slot = len(self._items)
+        haystacks = tuple(normalize(value or "") for value in self.fields(item))
+        self._slots[self.key(item)] = slot
+        self._items.append(item)
+        self._haystacks.append(haystacks)
+        self._texts.append("\0".join(haystacks))
+
+        grams = self._grams
+        for gram, score in gram_scores(haystacks, self.weights).items():
+            buckets = grams.get(gram)
+            if buckets is None:
+                grams[gram] = {score: [slot]}
+            else:
+                bucket = buckets.get(score)
+                if bucket is None:
+                    buckets[score] = [slot]
+                else:
+                    bucket.append(slot)
+        for haystack in set(haystacks):
+            if len(haystack) > GRAM_LENGTH:
+                self._exact.setdefault(haystack, []).append(slot)
+        if self._memo:
+            self._memo.clear()
+            self._gram_maps.clear()
+        return slot
+
+    def remove(self, item) -> bool:
+        slot = self._slots.pop(self.key(item), None)
+        if slot is None:
+            return False
+
+        haystacks = self._haystacks[slot]
+        for gram, score in gram_scores(haystacks, self.weights).items():
+            buckets = self._grams[gram]
+            bucket = buckets[score]
+            del bucket[bisect_left(bucket, slot)]
+            if not bucket:
+                del buckets[score]
+                if not buckets:
+                    del self._grams[gram]
+        for haystack in set(haystacks):
+            if len(haystack) > GRAM_LENGTH:
+                slots = self._exact[haystack]
+                slots.remove(slot)
+                if not slots:
+                    del self._exact[haystack]
+
+        self._items[slot] = None
+        self._haystacks[slot] = ()
+        self._texts[slot] = ""
+        self._memo.clear()
+        self._gram_maps.clear()
+        return True
+
+    def get(self, key, default=None) -> Any:
+        slot = self._slots.get(key)
+        return default if slot is None else self._items[slot]
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        boosts: dict[Any, float] | None = None,
+    ) -> list[Any]:
+        tokens = normalize(query).split()
+        boosts = {
+            self._slots[key]: boost
+            for key, boost in (boosts or {}).items()
+            if boost > 0 and key in self._slots
+        }
+
+        if not tokens:
+            top = sorted(boosts, key=lambda slot: (-boosts[slot], slot))[:limit]
+            rest = (item for slot, item in enumerate(self._items) if item is not None and slot not in boosts)
+            if limit is not None:
+                rest = islice(rest, max(limit - len(top), 0))
+            return [self._items[slot] for slot in top] + list(rest)
+
+        query = " ".join(tokens)
+        scores = self._memo.get(query)
+        if scores is None:
+            base = self._memo.find_base(query, self._narrows)
+            if base is not None:
+                scores = self._match_all(tokens, base)
+                self._memo.put(query, scores)
+            else:
+                scores, complete = self._match_top(tokens, limit)
+                if complete:
+                    self._memo.put(query, scores)
+        scores = dict(scores)
+
+        if len(scores) < (limit or FUZZY_MIN_RESULTS):
+            scores.update(self._match_fuzzy(tokens, scores))
+        score_of = self._scorer(tokens, lookups=False)
+        for slot in boosts.keys() - scores.keys():
+            score = score_of(slot)
+            if score:
+                scores[slot] = score
+        return self._rank(scores, limit, boosts)
+
+    def _rank(self, scores: dict[int, float], limit: int | None, boosts: dict[int, float]) -> list[Any]:
+        for slot, boost in boosts.items():
+            if slot in scores:
+                scores[slot] *= 1.0 + boost
+
+        key = self._rank_key
+        if limit is None:
+            ranked = sorted(scores.items(), key=key, reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, scores.items(), key=key)
+        return [self._items[slot] for slot, _ in ranked]
+
+    @staticmethod
+    def _rank_key(pair: tuple[int, float]) -> tuple[float, int]:
+        return pair[1], -pair[0]
+
+    # Narrowing is sound when every token of the old query is contained in
+    # the matching token of the new one.
+    @staticmethod
+    def _narrows(previous: str, current: str) -> bool:
+        previous_tokens = previous.split()
+        current_tokens = current.split()
+        if len(current_tokens) < len(previous_tokens):
+            return False
+        return all(old in new for old, new in zip(previous_tokens, current_tokens))
+
+    def _gram_map(self, gram: str) -> dict[int, float]:
+        scores = self._gram_maps.get(gram)
+        if scores is None:
+            buckets = self._grams.get(gram, {})
+            scores = {slot: score for score, slots in buckets.items() for slot in slots}
+            self._gram_maps.put(gram, scores)
+        return scores
+
+    # Tokens short enough to be a gram are scored by a lookup in the gram's
+    # slot map, longer ones by scanning the item's fields. Building a map
+    # costs a pass over the gram's postings, so a handful of slots are
+    # cheaper to scan.
+    def _scorer(self, tokens: list[str], lookups: bool = True) -> Callable[[int], float]:
+        if lookups:
+            scans = [token for token in tokens if len(token) > GRAM_LENGTH]
+            lookups = [self._gram_map(token) for token in tokens if len(token) <= GRAM_LENGTH]
+        else:
+            scans = tokens
+            lookups = []
+        all_haystacks = self._haystacks
+        texts = self._texts
+        weights = self.weights
+
+        def score_of(slot: int) -> float:
+            total = 0.0
+            for scores in lookups:
+                score = scores.get(slot)
+                if score is None:
+                    return 0.0
+                total += score
+            if scans:
+                text = texts[slot]
+                haystacks = all_haystacks[slot]
+                for token in scans:
+                    if token not in text:
+                        return 0.0
+                    best = 0.0
+                    for haystack, weight in zip(haystacks, weights):
+                        score = field_score(haystack, token, weight)
+                        if score > best:
+                            best = score
+                    if not best:
+                        return 0.0
+                    total += best
+            return total
+
+        return score_of
+
+    def _match_all(self, tokens: list[str], candidates: Iterable[int]) -> dict[int, float]:
+        score_of = self._scorer(tokens)
+        matches = {}
+        for slot in candidates:
+            score = score_of(slot)
+            if score:
+                matches[slot] = score
+        return matches
+
+    def _walk(self, gram: str):
+        buckets = self._grams.get(gram)
+        if buckets:
+            for score in sorted(buckets, reverse=True):
+                for slot in buckets[score]:
+                    yield slot, score
+
+    def _posting_size(self, gram: str) -> int:
+        return sum(map(len, self._grams.get(gram, {}).values()))
+
+    def _best_score(self, token: str) -> float:
+        buckets = self._grams.get(token[:GRAM_LENGTH])
+        if not buckets:
+            return 0.0
+        if len(token) > GRAM_LENGTH and token in self._exact:
+            return max(self.weights) * EXACT_BONUS
+        return max(buckets)
+
+    # Threshold walk: a token of up to GRAM_LENGTH characters scores exactly
+    # its gram bucket, and a longer one at most the bucket of its leading
+    # gram unless it equals a whole field. Walking the driver token's
+    # buckets best first, the walk stops once no remaining slot can beat
+    # the current top `limit`. Returns the matches and whether they are all
+    # of them.
+    def _match_top(self, tokens: list[str], limit: int | None) -> tuple[dict[int, float], bool]:
+        for token in tokens:
+            if not self._best_score(token):
+                return {}, True
+
+        rarest = min(
+            (token[i : i + GRAM_LENGTH] for token in tokens for i in range(max(len(token) - GRAM_LENGTH, 0) + 1)),
+            key=self._posting_size,
+        )
+        driver = min(tokens, key=lambda token: self._posting_size(token[:GRAM_LENGTH]))
+        driver_size = self._posting_size(driver[:GRAM_LENGTH])
+        if limit is None or self._posting_size(rarest) * 4 < driver_size:
+            return self._match_all(tokens, (slot for slot, _ in self._walk(rarest))), True
+
+        others = list(tokens)
+        others.remove(driver)
+        ceiling = sum(map(self._best_score, others))
+        exact_driver = len(driver) <= GRAM_LENGTH
+        score_of = self._scorer(others if exact_driver else tokens)
+
+        matches = {}
+        heap = []
+
+        def keep(slot: int, score: float):
+            matches[slot] = score
+            if len(heap) < limit:
+                heapq.heappush(heap, (score, -slot))
+            elif (score, -slot) > heap[0]:
+                heapq.heapreplace(heap, (score, -slot))
+
+        if not exact_driver:
+            for slot in self._exact.get(driver, ()):
+                score = score_of(slot)
+                if score:
+                    keep(slot, score)
+
+        for slot, bound in self._walk(driver[:GRAM_LENGTH]):
+            if len(heap) >= limit and (bound + ceiling, -slot) < heap[0]:
+                return matches, False
+            if slot in matches:
+                continue
+            score = score_of(slot)
+            if exact_driver and (score or not others):
+                score += bound
+            if score:
+                keep(slot, score)
+        return matches, True
+
+    def _match_fuzzy(self, tokens: list[str], exclude: dict[int, float]) -> dict[int, float]:
+        grams = set().union(*map(get_trigrams, tokens))
+        if not grams:
+            return {}
+
+        common = max(len(self) // 4, 8)
+        overlap = Counter()
+        for gram in grams:
+            buckets = self._grams.get(gram)
+            if buckets and self._posting_size(gram) <= common:
+                for slots in buckets.values():
+                    overlap.update(slots)
+
+        matches = {}
+        for slot, count in overlap.items():
+            ratio = count / len(grams)
+            if ratio >= FUZZY_MIN_OVERLAP and slot not in exclude:
+                matches[slot] = FUZZY_WEIGHT * ratio
+        return matches
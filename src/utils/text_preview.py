@@ -0,0 +1,66 @@
+import re
+from typing import Hashable, NamedTuple
+
+from gi.repository import Pango
+
+from utils.lru import LRUCache
+
+ANSI_ESCAPES = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)?|[@-Z\\-_])")
+CONTROL_CHARACTERS = re.compile("[\x00-\x08\x0b-\x1f\x7f-\x9f\u200b-\u200f\u2028\u2029\ufeff]")
+
+
+class TextPreview(NamedTuple):
+    text: str
+    lines: int
+    height: int
+
+
+def clamp_preview(text: str, max_lines: int = 3, max_chars: int = 300) -> str:
+    source = text[: max_chars * 4]
+    truncated = len(source) < len(text)
+    source = source.replace("\r\n", "\n").replace("\r", "\n").replace("\t", "    ")
+    source = CONTROL_CHARACTERS.sub("", ANSI_ESCAPES.sub("", source))
+    lines = [line.rstrip() for line in source.split("\n") if line.strip()]
+    truncated = truncated or len(lines) > max_lines
+    preview = "\n".join(lines[:max_lines])
+    if len(preview) > max_chars:
+        preview = preview[:max_chars].rstrip()
+        truncated = True
+    return preview + "…" if truncated else preview
+
+
+def configure_label(label, max_lines: int = 3):
+    label.set_line_wrap(True)
+    label.set_line_wrap_mode(Pango.WrapMode.WORD_CHAR)
+    label.set_ellipsize(Pango.EllipsizeMode.END)
+    label.set_lines(max_lines)
+    label.set_xalign(0)
+
+
+class PreviewLayouts:
+    def __init__(self, max_lines: int = 3, max_chars: int = 300, size: int = 1024):
+        self.max_lines = max_lines
+        self.max_chars = max_chars
+        self._cache = LRUCache(size, lambda _: 1)
+
+    def get(self, key: Hashable, text: str, context: Pango.Context, width: int) -> TextPreview:
+        cache_key = (key, width, len(text))
+        preview = self._cache.get(cache_key)
+        if preview is not None:
+            return preview
+
+        clamped = clamp_preview(text, self.max_lines, self.max_chars)
+        layout = Pango.Layout.new(context)
+        layout.set_text(clamped, -1)
+        layout.set_width(width * Pango.SCALE)
+        layout.set_wrap(Pango.WrapMode.WORD_CHAR)
+        layout.set_ellipsize(Pango.EllipsizeMode.END)
+        layout.set_height(-self.max_lines)
+        _, logical = layout.get_pixel_extents()
+
+        preview = TextPreview(clamped, layout.get_line_count(), logical.height)
+        self._cache.put(cache_key, preview)
+        return preview
+
+    def clear(self):
+        self._cache.clear()
@@ -0,0 +1,167 @@
+import os
+from multiprocessing import resource_tracker, shared_memory
+
+from PIL import ExifTags, Image, ImageOps, PngImagePlugin
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SOFTWARE = "exslauncher"
+HASH_SIZE = 32
+HASH_BITS = 8
+HISTOGRAM_SIZE = 64
+TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+Thumbnail = tuple[str, int, int, int, bool]
+Features = tuple[int, int, int, int, int, bytes]
+
+if np is not None:
+    DCT = np.cos(np.pi * np.outer(np.arange(HASH_SIZE), 2 * np.arange(HASH_SIZE) + 1) / (2 * HASH_SIZE))
+
+
+def write_thumbnail(image: Image.Image, target: str, uri: str, stat: os.stat_result):
+    info = PngImagePlugin.PngInfo()
+    info.add_text("Thumb::URI", uri)
+    info.add_text("Thumb::MTime", str(int(stat.st_mtime)))
+    info.add_text("Thumb::Size", str(stat.st_size))
+    info.add_text("Software", SOFTWARE)
+    save_png(image, target, pnginfo=info)
+
+
+def save_png(image: Image.Image, target: str, **params) -> bool:
+    temp_file = f"{target}.{os.getpid()}.tmp"
+    try:
+        image.save(temp_file, "PNG", compress_level=1, **params)
+        os.chmod(temp_file, 0o600)
+        os.replace(temp_file, target)
+        return True
+    except OSError:
+        try:
+            os.unlink(temp_file)
+        except OSError:
+            pass
+        return False
+
+
+def pixel_mode(image: Image.Image) -> str:
+    return "RGBA" if "A" in image.getbands() or "transparency" in image.info else "RGB"
+
+
+def read_thumbnail(target: str, uri: str, stat: os.stat_result) -> Image.Image | None:
+    try:
+        with Image.open(target) as image:
+            text = getattr(image, "text", {})
+            if text.get("Thumb::URI") != uri or text.get("Thumb::MTime") != str(int(stat.st_mtime)):
+                return None
+            if text.get("Thumb::Size", str(stat.st_size)) != str(stat.st_size):
+                return None
+            image.load()
+            return image.copy()
+    except (OSError, ValueError):
+        return None
+
+
+def share_pixels(image: Image.Image) -> Thumbnail:
+    data = image.tobytes()
+    memory = shared_memory.SharedMemory(create=True, size=len(data))
+    resource_tracker.unregister(memory._name, "shared_memory")
+    memory.buf[: len(data)] = data
+    name = memory.name
+    memory.close()
+    return name, image.width, image.height, len(data) // image.height, image.mode == "RGBA"
+
+
+def render_thumbnail(
+    path: str,
+    uri: str,
+    height: int,
+    cache_size: int,
+    cache_path: str,
+    fail_path: str,
+) -> Thumbnail | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    if read_thumbnail(fail_path, uri, stat) is not None:
+        return None
+    image = read_thumbnail(cache_path, uri, stat)
+    if image is None:
+        image = generate_thumbnail(path, uri, stat, cache_size, cache_path, fail_path)
+    if image is None:
+        return None
+
+    image = image.convert(pixel_mode(image))
+    width = max(1, round(image.width * height / image.height))
+    if image.height != height:
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+    return share_pixels(image)
+
+
+def generate_thumbnail(
+    path: str,
+    uri: str,
+    stat: os.stat_result,
+    cache_size: int,
+    cache_path: str,
+    fail_path: str,
+) -> Image.Image | None:
+    try:
+        with Image.open(path) as image:
+            image.thumbnail((cache_size, cache_size), Image.Resampling.LANCZOS, reducing_gap=2.0)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert(pixel_mode(image))
+    except (OSError, ValueError, Image.DecompressionBombError):
+        write_thumbnail(Image.new("RGBA", (1, 1)), fail_path, uri, stat)
+        return None
+
+    write_thumbnail(image, cache_path, uri, stat)
+    return image
+
+
+def perceptual_hash(image: Image.Image) -> int:
+    pixels = np.asarray(image.convert("L").resize((HASH_SIZE, HASH_SIZE), Image.Resampling.BILINEAR), np.float64)
+    low = (DCT @ pixels @ DCT.T)[:HASH_BITS, :HASH_BITS].ravel()
+    bits = low > np.median(low[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def color_histogram(image: Image.Image) -> bytes:
+    pixels = np.asarray(image.convert("RGB").resize((64, 64), Image.Resampling.BILINEAR), np.uint8) >> 6
+    bins = (pixels[..., 0] << 4) | (pixels[..., 1] << 2) | pixels[..., 2]
+    counts = np.bincount(bins.ravel(), minlength=HISTOGRAM_SIZE)
+    return np.round(counts * 255 / counts.sum()).astype(np.uint8).tobytes()
+
+
+def compute_features(path: str, uri: str, cache_size: int, cache_path: str, fail_path: str) -> Features | None:
+    if np is None:
+        return None
+    try:
+        stat = os.stat(path)
+        with Image.open(path) as source:
+            width, height = source.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    image = read_thumbnail(cache_path, uri, stat)
+    if image is None and read_thumbnail(fail_path, uri, stat) is None:
+        image = generate_thumbnail(path, uri, stat, cache_size, cache_path, fail_path)
+    if image is None:
+        return None
+    return stat.st_mtime_ns, stat.st_size, width, height, perceptual_hash(image), color_histogram(image)
+
+
+def prescale_wallpaper(path: str, width: int, height: int, target: str) -> bool:
+    try:
+        with Image.open(path) as image:
+            # draft() works on the stored axes, before exif_transpose rotates them.
+            orientation = image.getexif().get(ExifTags.Base.Orientation, 1)
+            image.draft("RGB", (height, width) if orientation in TRANSPOSED_ORIENTATIONS else (width, height))
+            image = ImageOps.exif_transpose(image)
+            image = ImageOps.fit(image.convert(pixel_mode(image)), (width, height), Image.Resampling.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return False
+    return save_png(image, target)
@@ -0,0 +1,106 @@
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+from typing import Callable
+
+from gi.repository import GdkPixbuf, GLib
+
+from utils.thumbnail_worker import SOFTWARE, Features, Thumbnail, compute_features, prescale_wallpaper, render_thumbnail
+
+THUMBNAIL_SIZES = {"normal": 128, "large": 256, "x-large": 512, "xx-large": 1024}
+
+
+def get_thumbnails_path() -> Path:
+    return Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "thumbnails"
+
+
+def get_file_uri(path: str) -> str:
+    return GLib.filename_to_uri(os.path.abspath(path), None)
+
+
+class ThumbnailCache:
+    def __init__(self, flavor: str = "x-large"):
+        self.flavor = flavor
+        self.size = THUMBNAIL_SIZES[flavor]
+        root = get_thumbnails_path()
+        self.directory = root / flavor
+        self.fail_directory = root / "fail" / SOFTWARE
+        for directory in (self.directory, self.fail_directory):
+            directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    def thumbnail_path(self, uri: str) -> Path:
+        return self.directory / f"{hashlib.md5(uri.encode()).hexdigest()}.png"
+
+    def fail_path(self, uri: str) -> Path:
+        return self.fail_directory / f"{hashlib.md5(uri.encode()).hexdigest()}.png"
+
+
+def pixbuf_from_shared(thumbnail: Thumbnail) -> GdkPixbuf.Pixbuf:
+    name, width, height, rowstride, has_alpha = thumbnail
+    memory = shared_memory.SharedMemory(name=name)
+    try:
+        with memory.buf[: rowstride * height] as pixels:
+            data = GLib.Bytes.new(pixels)
+    finally:
+        memory.close()
+        memory.unlink()
+    return GdkPixbuf.Pixbuf.new_from_bytes(data, GdkPixbuf.Colorspace.RGB, has_alpha, 8, width, height, rowstride)
+
+
+class ThumbnailPool:
+    def __init__(self, cache: ThumbnailCache, height: int, workers: int | None = None):
+        self.cache = cache
+        self.height = height
+        self.workers = workers or os.cpu_count() or 1
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["utils.thumbnail_worker"])
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+
+    def submit(self, path: str, callback: Callable[[GdkPixbuf.Pixbuf | None], None]):
+        uri = get_file_uri(path)
+        future = self._executor.submit(
+            render_thumbnail,
+            path,
+            uri,
+            self.height,
+            self.cache.size,
+            str(self.cache.thumbnail_path(uri)),
+            str(self.cache.fail_path(uri)),
+        )
+        future.add_done_callback(lambda future: self._finish(future, callback))
+
+    def features(self, path: str, callback: Callable[[Features | None], None]):
+        uri = get_file_uri(path)
+        future = self._executor.submit(
+            compute_features,
+            path,
+            uri,
+            self.cache.size,
+            str(self.cache.thumbnail_path(uri)),
+            str(self.cache.fail_path(uri)),
+        )
+        future.add_done_callback(lambda future: GLib.idle_add(callback, self._result(future)))
+
+    def prescale(self, path: str, width: int, height: int, target: str, callback: Callable[[bool], None]):
+        future = self._executor.submit(prescale_wallpaper, path, width, height, target)
+        future.add_done_callback(lambda future: GLib.idle_add(callback, bool(self._result(future))))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, future: Future, callback: Callable[[GdkPixbuf.Pixbuf | None], None]):
+        thumbnail = self._result(future)
+        try:
+            pixbuf = pixbuf_from_shared(thumbnail) if thumbnail is not None else None
+        except (OSError, GLib.Error):
+            pixbuf = None
+        GLib.idle_add(callback, pixbuf)
+
+    def _result(self, future: Future):
+        try:
+            return future.result()
+        except Exception:
+            return None
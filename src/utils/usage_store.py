@@ -0,0 +1,62 @@
+import heapq
+import math
+import sqlite3
+import time
+from pathlib import Path
+
+from utils.path import get_state_path
+
+HALF_LIFE = 3 * 24 * 60 * 60
+FRECENCY_WEIGHT = 0.5
+# Boosts decay slowly next to the half-life, so they are reused between
+# launches and only refreshed this often.
+BOOSTS_TTL = 60 * 60
+
+
+class UsageStore:
+    def __init__(self, path: str | Path | None = None, half_life: float = HALF_LIFE):
+        self.path = path or get_state_path() / "usage.sqlite3"
+        self.decay = math.log(2) / half_life
+        self._db = sqlite3.connect(self.path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "key TEXT PRIMARY KEY, rank REAL NOT NULL, "
+            "count INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._ranks: dict[str, float] = dict(self._db.execute("SELECT key, rank FROM usage"))
+        self._boosts: dict[str, float] | None = None
+        self._boosts_time = 0.0
+
+    # A launch adds 1 to a score that halves every half_life seconds. Storing
+    # log(score) + decay * t keeps ranks comparable without rewriting rows.
+    def score(self, key: str, now: float | None = None) -> float:
+        rank = self._ranks.get(key)
+        if rank is None:
+            return 0.0
+        return math.exp(rank - self.decay * (now or time.time()))
+
+    def record(self, key: str, now: float | None = None):
+        now = now or time.time()
+        rank = self.decay * now + math.log(self.score(key, now) + 1.0)
+        self._ranks[key] = rank
+        self._boosts = None
+        self._db.execute(
+            "INSERT INTO usage (key, rank, count, last_used) VALUES (?, ?, 1, ?) "
+            "ON CONFLICT(key) DO UPDATE SET rank = excluded.rank, "
+            "count = count + 1, last_used = excluded.last_used",
+            (key, rank, now),
+        )
+        self._db.commit()
+
+    def top(self, limit: int) -> list[str]:
+        return heapq.nlargest(limit, self._ranks, key=self._ranks.__getitem__)
+
+    def boosts(self, now: float | None = None) -> dict[str, float]:
+        now = now or time.time()
+        if self._boosts is None or now - self._boosts_time > BOOSTS_TTL:
+            self._boosts = {
+                key: FRECENCY_WEIGHT * math.log1p(self.score(key, now))
+                for key in self._ranks
+            }
+            self._boosts_time = now
+        return self._boosts
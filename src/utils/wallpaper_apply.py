@@ -0,0 +1,147 @@
+import hashlib
+import os
+import re
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+from utils.path import get_cache_path
+from utils.process import spawn
+from utils.thumbnails import ThumbnailPool
+
+OUTPUT_LINE = re.compile(r"^:?\s*(?P<name>[^:\s]+):\s*(?P<width>\d+)x(?P<height>\d+),\s*scale:\s*(?P<scale>[\d.]+)")
+TRANSITION = ["--transition-fps", "144", "--transition-duration", "1", "-t", "any"]
+UNSCALED_EXTENSIONS = (".gif",)
+CURRENT_WALLPAPER = Path.home() / ".current.wall"
+MAX_CACHED_BYTES = 512 * 1024 * 1024
+MAX_PRESCALING = 1
+MAX_QUEUED = 8
+
+
+class Output(NamedTuple):
+    name: str
+    width: int
+    height: int
+    scale: float
+
+
+def parse_outputs(text: str) -> list[Output]:
+    outputs = []
+    for line in text.splitlines():
+        match = OUTPUT_LINE.match(line)
+        if match is not None:
+            outputs.append(
+                Output(match["name"], int(match["width"]), int(match["height"]), float(match["scale"]))
+            )
+    return outputs
+
+
+def set_current_wallpaper(path: str, link: Path = CURRENT_WALLPAPER):
+    temp_link = link.with_name(f".{link.name}.{os.getpid()}.tmp")
+    try:
+        temp_link.unlink(missing_ok=True)
+        os.symlink(path, temp_link)
+        os.replace(temp_link, link)
+    except OSError:
+        import traceback
+        traceback.print_exc()
+
+
+class WallpaperApplier:
+    def __init__(self, pool: ThumbnailPool, transition: list[str] | None = None):
+        self.pool = pool
+        self.transition = transition or TRANSITION
+        self.outputs: list[Output] = []
+        self.cache_directory = get_cache_path() / "wallpapers"
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        self._pending: set[Path] = set()
+        self._queue: deque[tuple[str, Output, Path]] = deque()
+        self._running = 0
+        self.prune()
+        self.refresh_outputs()
+
+    # Full-resolution copies run to tens of megabytes each, so the cache is
+    # bounded by size; apply() touches the copy in use to keep it newest.
+    def prune(self, max_bytes: int = MAX_CACHED_BYTES):
+        files = []
+        for item in os.scandir(self.cache_directory):
+            try:
+                stat = item.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, item.path))
+        total = 0
+        for _, size, path in sorted(files, reverse=True):
+            total += size
+            if total <= max_bytes:
+                continue
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def refresh_outputs(self):
+        def on_done(returncode, output):
+            if returncode == 0:
+                self.outputs = parse_outputs(output.decode(errors="replace"))
+
+        spawn(["swww", "query"], on_done=on_done, capture_output=True)
+
+    def scaled_path(self, wallpaper: dict, output: Output) -> Path | None:
+        if wallpaper["path"].lower().endswith(UNSCALED_EXTENSIONS):
+            return None
+        source = f"{wallpaper['path']}\0{wallpaper.get('mtime')}\0{wallpaper.get('size')}"
+        digest = hashlib.blake2b(source.encode(), digest_size=16).hexdigest()
+        return self.cache_directory / f"{digest}-{output.width}x{output.height}@{output.scale:g}.png"
+
+    # swww query reports each output in physical pixels (the logical size
+    # times the scale), which is the buffer swww img fills, so the copies
+    # are rendered at that size and the scale only keys the file name.
+    def prepare(self, wallpaper: dict):
+        for output in self.outputs:
+            target = self.scaled_path(wallpaper, output)
+            if target is None or target in self._pending or target.exists():
+                continue
+            if len(self._queue) >= MAX_QUEUED:
+                self._pending.discard(self._queue.popleft()[2])
+            self._pending.add(target)
+            self._queue.append((wallpaper["path"], output, target))
+        self._drain()
+
+    # Pre-scales share the pool with the grid's thumbnails, so only a few
+    # run at once and the most recently selected wallpaper goes first.
+    def _drain(self):
+        while self._running < MAX_PRESCALING and self._queue:
+            path, output, target = self._queue.pop()
+            self._running += 1
+            self.pool.prescale(
+                path,
+                output.width,
+                output.height,
+                str(target),
+                lambda written, target=target: self._on_prescaled(target, written),
+            )
+
+    def _on_prescaled(self, target: Path, written: bool):
+        self._running -= 1
+        self._pending.discard(target)
+        if written:
+            self.prune()
+        self._drain()
+
+    def apply(self, wallpaper: dict):
+        if not self.outputs:
+            spawn(["swww", "img", *self.transition, wallpaper["path"]])
+        for output in self.outputs:
+            target = self.scaled_path(wallpaper, output)
+            source = wallpaper["path"]
+            if target is not None:
+                try:
+                    os.utime(target)
+                    source = str(target)
+                except OSError:
+                    pass
+            spawn(["swww", "img", "-o", output.name, *self.transition, source])
+        set_current_wallpaper(wallpaper["path"])
+        self.prepare(wallpaper)
+        self.refresh_outputs()
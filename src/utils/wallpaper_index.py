@@ -0,0 +1,210 @@
+import sqlite3
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+from gi.repository import GLib
+
+from utils.path import get_cache_path
+from utils.thumbnail_worker import Features, np
+from utils.thumbnails import ThumbnailPool
+
+DUPLICATE_DISTANCE = 6
+DUPLICATE_OVERLAP = 0.85
+HASH_WEIGHT = 0.6
+NOTIFY_INTERVAL = 1000
+
+if np is not None:
+    POPCOUNT = np.array([bin(value).count("1") for value in range(256)], np.uint8)
+
+
+def hamming(left, right):
+    xor = np.bitwise_xor(left, right)
+    return POPCOUNT[xor.view(np.uint8)].reshape(*xor.shape, 8).sum(-1)
+
+
+def to_signed(value: int) -> int:
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class WallpaperIndex:
+    def __init__(
+        self,
+        pool: ThumbnailPool,
+        path: str | Path | None = None,
+        on_changed: Callable[[], None] | None = None,
+    ):
+        self.pool = pool
+        self.on_changed = on_changed
+        self.available = np is not None
+        self._records: dict[str, Features] = {}
+        self._representatives: dict[str, str] = {}
+        self._arrays = None
+        self._queue: list[dict] = []
+        self._loading: set[str] = set()
+        self._max_loading = max(1, pool.workers // 2)
+        self._notify_id = None
+        if not self.available:
+            return
+
+        self._db = sqlite3.connect(path or get_cache_path() / "wallpaper-index.sqlite3")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS features ("
+            "path TEXT PRIMARY KEY, mtime INTEGER NOT NULL, size INTEGER NOT NULL, "
+            "width INTEGER NOT NULL, height INTEGER NOT NULL, "
+            "phash INTEGER NOT NULL, histogram BLOB NOT NULL)"
+        )
+        for path, mtime, size, width, height, phash, histogram in self._db.execute("SELECT * FROM features"):
+            self._records[path] = (mtime, size, width, height, phash & ((1 << 64) - 1), histogram)
+        self._group()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def is_current(self, wallpaper: dict) -> bool:
+        record = self._records.get(wallpaper["path"])
+        return record is not None and record[:2] == (wallpaper["mtime"], wallpaper["size"])
+
+    def sync(self, wallpapers: Iterable[dict]):
+        if not self.available:
+            return
+        wallpapers = list(wallpapers)
+        live = {wallpaper["path"] for wallpaper in wallpapers}
+        self.remove(path for path in self._records if path not in live)
+        self._queue = [wallpaper for wallpaper in reversed(wallpapers) if not self.is_current(wallpaper)]
+        self._dispatch()
+
+    def add(self, wallpapers: Iterable[dict]):
+        if not self.available:
+            return
+        self._queue.extend(wallpaper for wallpaper in wallpapers if not self.is_current(wallpaper))
+        self._dispatch()
+
+    def remove(self, paths: Iterable[str]):
+        if not self.available:
+            return
+        removed = [(path,) for path in list(paths) if self._records.pop(path, None) is not None]
+        if removed:
+            self._db.executemany("DELETE FROM features WHERE path = ?", removed)
+            self._db.commit()
+            self._queue_notify()
+
+    def collapse(self, items: list[Any], key: Callable[[Any], str]) -> list[Any]:
+        if not self._representatives:
+            return items
+        present = {key(item) for item in items}
+        shown = set()
+        collapsed = []
+        for item in items:
+            path = key(item)
+            representative = self._representatives.get(path)
+            if representative is None:
+                collapsed.append(item)
+            elif representative in present:
+                if representative == path:
+                    collapsed.append(item)
+            elif representative not in shown:
+                shown.add(representative)
+                collapsed.append(item)
+        return collapsed
+
+    def similar(self, path: str, limit: int = 50) -> list[str]:
+        arrays = self._get_arrays()
+        if arrays is None or path not in arrays[0]:
+            return []
+        positions, paths, hashes, histograms = arrays
+        position = positions[path]
+        distance = hamming(hashes, hashes[position]) / 64
+        overlap = np.minimum(histograms, histograms[position]).sum(1) / 255
+        score = HASH_WEIGHT * distance + (1 - HASH_WEIGHT) * (1 - overlap)
+        order = np.argsort(score, kind="stable")
+        return [paths[index] for index in order[: limit + 1] if index != position][:limit]
+
+    def _dispatch(self):
+        while self._queue and len(self._loading) < self._max_loading:
+            wallpaper = self._queue.pop()
+            if wallpaper["path"] in self._loading or self.is_current(wallpaper):
+                continue
+            self._loading.add(wallpaper["path"])
+            self.pool.features(wallpaper["path"], lambda features, path=wallpaper["path"]: self._on_features(path, features))
+
+    def _on_features(self, path: str, features: Features | None):
+        self._loading.discard(path)
+        if features is not None:
+            self._records[path] = features
+            self._db.execute(
+                "INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (path, *features[:4], to_signed(features[4]), features[5]),
+            )
+            self._queue_notify()
+        self._dispatch()
+        return False
+
+    def _queue_notify(self):
+        self._arrays = None
+        if self._notify_id is None:
+            self._notify_id = GLib.timeout_add(NOTIFY_INTERVAL, self._notify)
+
+    def _notify(self):
+        self._notify_id = None
+        self._db.commit()
+        self._group()
+        if self.on_changed is not None:
+            self.on_changed()
+        return False
+
+    def _get_arrays(self):
+        if self._arrays is None and self._records:
+            paths = list(self._records)
+            records = self._records.values()
+            self._arrays = (
+                {path: position for position, path in enumerate(paths)},
+                paths,
+                np.array([record[4] for record in records], np.uint64),
+                np.frombuffer(b"".join(record[5] for record in records), np.uint8).reshape(-1, 64),
+            )
+        return self._arrays
+
+    def _group(self):
+        self._representatives = {}
+        arrays = self._get_arrays()
+        if arrays is None:
+            return
+        _, paths, hashes, histograms = arrays
+        parents = list(range(len(paths)))
+
+        def find(position):
+            while parents[position] != position:
+                parents[position] = parents[parents[position]]
+                position = parents[position]
+            return position
+
+        # Two hashes within DUPLICATE_DISTANCE bits agree on at least one of
+        # the eight bytes, so only items sharing a byte value are compared.
+        for shift in range(0, 64, 8):
+            keys = (hashes >> np.uint64(shift)) & np.uint64(0xFF)
+            order = np.argsort(keys, kind="stable")
+            for members in np.split(order, np.flatnonzero(np.diff(keys[order])) + 1):
+                if len(members) < 2:
+                    continue
+                distances = hamming(hashes[members][:, None], hashes[members][None, :])
+                rows, columns = np.nonzero(np.triu(distances <= DUPLICATE_DISTANCE, 1))
+                if not len(rows):
+                    continue
+                left, right = members[rows], members[columns]
+                overlap = np.minimum(histograms[left], histograms[right]).sum(1) / 255
+                for first, second in zip(left[overlap >= DUPLICATE_OVERLAP], right[overlap >= DUPLICATE_OVERLAP]):
+                    parents[find(int(first))] = find(int(second))
+
+        def rank(position):
+            _, _, width, height, _, _ = self._records[paths[position]]
+            return width * height, -len(paths[position])
+
+        groups: dict[int, list[int]] = {}
+        for position in range(len(paths)):
+            groups.setdefault(find(position), []).append(position)
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            best = max(members, key=rank)
+            for position in members:
+                self._representatives[paths[position]] = paths[best]
@@ -0,0 +1,179 @@
+import os
+from typing import Iterable
+
+from gi.repository import Gio, GLib
+
+from fabric.core.service import Service, Signal
+
+WALLPAPER_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".avif", ".gif")
+
+
+class WallpaperLibrary(Service):
+    @Signal
+    def changed(self, added: object, removed: object) -> None: ...
+
+    def __init__(self, roots: Iterable[str], debounce: int = 300, **kwargs):
+        super().__init__(**kwargs)
+        self.roots = list(dict.fromkeys(os.path.abspath(os.path.expanduser(root)) for root in roots))
+        self.debounce = debounce
+        self._wallpapers: dict[str, dict] = {}
+        self._files: dict[str, set[str]] = {}
+        self._subdirectories: dict[str, set[str]] = {}
+        self._monitors: dict[str, Gio.FileMonitor] = {}
+        self._missing_monitors: dict[str, Gio.FileMonitor] = {}
+        self._dirty: set[str] = set()
+        self._rescan_id = None
+
+        self.rescan()
+
+    @property
+    def wallpapers(self) -> list[dict]:
+        return sorted(self._wallpapers.values(), key=lambda wallpaper: (wallpaper["name"].casefold(), wallpaper["path"]))
+
+    def get(self, path: str) -> dict | None:
+        return self._wallpapers.get(path)
+
+    def rescan(self):
+        added, removed = [], []
+        for directory in list(self._files):
+            if not any(self._is_inside(directory, root) for root in self.roots):
+                self._drop_directory(directory, removed)
+        for root in self.roots:
+            self._scan_directory(root, added, removed, recursive=True)
+        self._emit(added, removed)
+
+    def queue_rescan(self, directory: str):
+        self._dirty.add(directory)
+        if self._rescan_id is not None:
+            GLib.source_remove(self._rescan_id)
+
+        def rescan():
+            self._rescan_id = None
+            self._rescan_dirty()
+            return False
+
+        self._rescan_id = GLib.timeout_add(self.debounce, rescan)
+
+    def _rescan_dirty(self):
+        dirty, self._dirty = self._dirty, set()
+        added, removed = [], []
+        for directory in sorted(dirty):
+            if directory in self._files or directory in self.roots:
+                self._scan_directory(directory, added, removed)
+        self._emit(added, removed)
+
+    def _scan_directory(self, directory: str, added: list, removed: list, recursive: bool = False):
+        files = {}
+        subdirectories = set()
+        try:
+            with os.scandir(directory) as iterator:
+                for item in iterator:
+                    if item.name.startswith("."):
+                        continue
+                    try:
+                        if item.is_dir():
+                            subdirectories.add(item.path)
+                        elif item.name.lower().endswith(WALLPAPER_EXTENSIONS):
+                            stat = item.stat()
+                            files[item.path] = (stat.st_mtime_ns, stat.st_size)
+                    except OSError:
+                        continue
+        except OSError:
+            self._drop_directory(directory, removed)
+            if directory in self.roots:
+                self._watch_missing(directory)
+            return
+
+        known = self._files.get(directory, set())
+        for path in known - files.keys():
+            removed.append(self._wallpapers.pop(path))
+        for path, (mtime, size) in files.items():
+            wallpaper = self._wallpapers.get(path)
+            if wallpaper is not None and (wallpaper["mtime"], wallpaper["size"]) == (mtime, size):
+                continue
+            if wallpaper is not None:
+                removed.append(wallpaper)
+            wallpaper = {"name": os.path.basename(path), "path": path, "mtime": mtime, "size": size}
+            self._wallpapers[path] = wallpaper
+            added.append(wallpaper)
+        self._files[directory] = set(files)
+
+        previous = self._subdirectories.get(directory, set())
+        for subdirectory in previous - subdirectories:
+            self._drop_directory(subdirectory, removed)
+        self._subdirectories[directory] = subdirectories
+        self._watch(directory)
+        monitor = self._missing_monitors.pop(directory, None)
+        if monitor is not None:
+            monitor.cancel()
+
+        for subdirectory in subdirectories:
+            if recursive or subdirectory not in self._files:
+                if not self._is_loop(subdirectory):
+                    self._scan_directory(subdirectory, added, removed, recursive=True)
+
+    def _drop_directory(self, directory: str, removed: list):
+        for path in self._files.pop(directory, ()):
+            removed.append(self._wallpapers.pop(path))
+        for subdirectory in self._subdirectories.pop(directory, ()):
+            self._drop_directory(subdirectory, removed)
+        monitor = self._monitors.pop(directory, None)
+        if monitor is not None:
+            monitor.cancel()
+
+    def _watch(self, directory: str):
+        if directory in self._monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(directory).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        except GLib.Error:
+            return
+        monitor.connect("changed", lambda *args: self._on_directory_changed(directory, *args))
+        self._monitors[directory] = monitor
+
+    # A missing root has no monitor of its own, so its parent is watched
+    # until the root appears again.
+    def _watch_missing(self, root: str):
+        if root in self._missing_monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(os.path.dirname(root)).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        except GLib.Error:
+            return
+        monitor.connect("changed", lambda *args: self._on_parent_changed(root, *args))
+        self._missing_monitors[root] = monitor
+
+    def _on_parent_changed(self, root, monitor, file, other_file, event_type):
+        if event_type not in (
+            Gio.FileMonitorEvent.CREATED,
+            Gio.FileMonitorEvent.MOVED_IN,
+            Gio.FileMonitorEvent.RENAMED,
+        ):
+            return
+        paths = {target.get_path() for target in (file, other_file) if target is not None}
+        if root in paths:
+            self.queue_rescan(root)
+
+    def _on_directory_changed(self, directory, monitor, file, other_file, event_type):
+        if event_type in (
+            Gio.FileMonitorEvent.CHANGES_DONE_HINT,
+            Gio.FileMonitorEvent.DELETED,
+            Gio.FileMonitorEvent.CREATED,
+            Gio.FileMonitorEvent.MOVED_IN,
+            Gio.FileMonitorEvent.MOVED_OUT,
+            Gio.FileMonitorEvent.RENAMED,
+        ):
+            self.queue_rescan(directory)
+
+    def _is_loop(self, directory: str) -> bool:
+        real = os.path.realpath(directory)
+        parent = os.path.dirname(directory)
+        return real == os.path.realpath(parent) or self._is_inside(os.path.realpath(parent), real)
+
+    def _is_inside(self, path: str, directory: str) -> bool:
+        return path == directory or path.startswith(directory.rstrip(os.sep) + os.sep)
+
+    def _emit(self, added: list, removed: list):
+        added = [wallpaper for wallpaper in added if self._wallpapers.get(wallpaper["path"]) is wallpaper]
+        if added or removed:
+            self.changed(added, removed)
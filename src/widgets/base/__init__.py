@@ -1,5 +1,9 @@
 from widgets.base.animated import AnimatedWindow
+from widgets.base.render_scheduler import RenderScheduler
+from widgets.base.virtual_list import VirtualList
 
 __all__ = (
     "AnimatedWindow",
+    "RenderScheduler",
+    "VirtualList",
 )
@@ -0,0 +1,108 @@
+import time
+from collections import deque
+from typing import Callable
+
+from gi.repository import GLib, Gtk
+
+
+def summarize(samples: deque) -> dict[str, float]:
+    if not samples:
+        return {"last": 0.0, "mean": 0.0, "p95": 0.0}
+    ordered = sorted(samples)
+    return {
+        "last": samples[-1],
+        "mean": sum(samples) / len(samples),
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+    }
+
+
+class RenderScheduler:
+    def __init__(
+        self,
+        widget: Gtk.Widget,
+        render: Callable[[], None],
+        compute: Callable[[], None] | None = None,
+        frame_budget: float = 12.0,
+        debounce: int = 120,
+        samples: int = 32,
+    ):
+        self.widget = widget
+        self.render = render
+        self.compute = compute
+        self.frame_budget = frame_budget
+        self.debounce = debounce
+        self._compute_times = deque(maxlen=samples)
+        self._render_times = deque(maxlen=samples)
+        self._needs_compute = False
+        self._tick_id = None
+        self._source_id = None
+        widget.connect("unmap", self._on_unmap)
+
+    @property
+    def over_budget(self) -> bool:
+        recent = list(self._compute_times)[-8:]
+        recent_render = list(self._render_times)[-8:]
+        if not recent_render:
+            return False
+        cost = (sum(recent) / len(recent) if recent else 0.0) + sum(recent_render) / len(recent_render)
+        return cost > self.frame_budget
+
+    @property
+    def timings(self) -> dict:
+        return {
+            "mode": "debounce" if self.over_budget else "frame",
+            "frame_budget_ms": self.frame_budget,
+            "compute_ms": summarize(self._compute_times),
+            "render_ms": summarize(self._render_times),
+        }
+
+    def schedule(self, compute: bool = True):
+        self._needs_compute = self._needs_compute or (compute and self.compute is not None)
+
+        if self.over_budget:
+            self.cancel()
+            self._source_id = GLib.timeout_add(self.debounce, self._on_source)
+            return
+        if self._tick_id is not None or self._source_id is not None:
+            return
+        if self.widget.get_mapped():
+            self._tick_id = self.widget.add_tick_callback(self._on_tick)
+        else:
+            self._source_id = GLib.idle_add(self._on_source)
+
+    def cancel(self):
+        if self._tick_id is not None:
+            self.widget.remove_tick_callback(self._tick_id)
+            self._tick_id = None
+        if self._source_id is not None:
+            GLib.source_remove(self._source_id)
+            self._source_id = None
+
+    # An unmapped widget's frame clock stops ticking, so a pending tick would
+    # never run and would block every later schedule(); hand it to idle.
+    def _on_unmap(self, *_):
+        if self._tick_id is not None:
+            self.widget.remove_tick_callback(self._tick_id)
+            self._tick_id = None
+            self.schedule(compute=False)
+
+    def _on_tick(self, widget, frame_clock):
+        self._tick_id = None
+        self._run()
+        return GLib.SOURCE_REMOVE
+
+    def _on_source(self):
+        self._source_id = None
+        self._run()
+        return GLib.SOURCE_REMOVE
+
+    def _run(self):
+        start = time.perf_counter()
+        if self._needs_compute:
+            self._needs_compute = False
+            self.compute()
+            computed = time.perf_counter()
+            self._compute_times.append((computed - start) * 1000)
+            start = computed
+        self.render()
+        self._render_times.append((time.perf_counter() - start) * 1000)
@@ -0,0 +1,248 @@
+from bisect import bisect_right
+from typing import Any, Callable, Hashable, Iterable, Literal
+
+from gi.repository import Gtk
+
+from widgets.base.render_scheduler import RenderScheduler
+
+
+class VirtualList(Gtk.Layout):
+    def __init__(
+        self,
+        key: Callable[[Any], Hashable],
+        create_row: Callable[[], Gtk.Widget],
+        bind_row: Callable[[Gtk.Widget, Any], None],
+        row_size: int | Callable[[Any], int] = 40,
+        orientation: Literal["v", "h"] = "v",
+        spacing: int = 4,
+        overscan: int = 4,
+        on_range_changed: Callable[[int, int], None] | None = None,
+        name: str | None = None,
+    ):
+        super().__init__()
+        if name:
+            self.set_name(name)
+        self.key = key
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.row_size = row_size
+        self.vertical = orientation == "v"
+        self.spacing = spacing
+        self.overscan = overscan
+        self.on_range_changed = on_range_changed
+
+        self.items: list[Any] = []
+        self._offsets: list[int] | None = None
+        self._rows: dict[Hashable, Gtk.Widget] = {}
+        self._pool: list[Gtk.Widget] = []
+        self._range = (0, 0)
+        self._cross_size = 0
+        self._allocated_size = (0, 0)
+        self._measured = callable(row_size)
+        self._adjustment = None
+        self._layout_scheduler = RenderScheduler(self, render=self._relayout)
+
+        self.connect("notify::vadjustment" if self.vertical else "notify::hadjustment", self._on_adjustment_set)
+        self.connect("size-allocate", self._on_size_allocate)
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    @property
+    def visible_range(self) -> tuple[int, int]:
+        return self._range
+
+    @property
+    def total_size(self) -> int:
+        if not self.items:
+            return 0
+        return self.offset_of(len(self.items)) - self.spacing
+
+    def offset_of(self, index: int) -> int:
+        if self._offsets is not None:
+            return self._offsets[index]
+        return index * (self.row_size + self.spacing)
+
+    def size_of(self, index: int) -> int:
+        if callable(self.row_size):
+            return self.row_size(self.items[index])
+        return self.row_size
+
+    def index_at(self, offset: float) -> int:
+        if self._offsets is not None:
+            return max(bisect_right(self._offsets, offset) - 1, 0)
+        return max(int(offset // (self.row_size + self.spacing)), 0)
+
+    def set_items(self, items: Iterable[Any]):
+        self.items = list(items)
+        if callable(self.row_size):
+            offsets = [0]
+            for item in self.items:
+                offsets.append(offsets[-1] + self.row_size(item) + self.spacing)
+            self._offsets = offsets
+        self._update_size()
+        self._update_rows(animate=True)
+
+    def refresh(self):
+        for row in self._rows.values():
+            self._bind(row, row.item)
+
+    def refresh_item(self, item: Any):
+        row = self._rows.get(self.key(item))
+        if row is not None:
+            self._bind(row, item)
+
+    def get_row(self, index: int) -> Gtk.Widget | None:
+        if not 0 <= index < len(self.items):
+            return None
+        self.scroll_to(index)
+        return self._rows.get(self.key(self.items[index]))
+
+    def scroll_to(self, index: int):
+        adjustment = self._adjustment
+        if adjustment is None:
+            return
+        start = self.offset_of(index)
+        end = start + self.size_of(index)
+        value = adjustment.get_value()
+        page = adjustment.get_page_size()
+        if start < value:
+            adjustment.set_value(start)
+        elif end > value + page:
+            adjustment.set_value(end - page)
+        self._update_rows()
+
+    def _on_adjustment_set(self, *_):
+        adjustment = self.get_vadjustment() if self.vertical else self.get_hadjustment()
+        if adjustment is self._adjustment:
+            return
+        self._adjustment = adjustment
+        if adjustment is not None:
+            adjustment.connect("value-changed", lambda *_: self._update_rows())
+
+    # Resizing and moving children from inside size-allocate queues another
+    # allocation, so placement waits for the next frame.
+    def _on_size_allocate(self, widget, allocation):
+        size = (allocation.width, allocation.height)
+        if size != self._allocated_size:
+            self._allocated_size = size
+            self._layout_scheduler.schedule()
+
+    def _relayout(self):
+        width, height = self._allocated_size
+        cross_size = width if self.vertical else height
+        if cross_size != self._cross_size:
+            self._cross_size = cross_size
+            for row in self._rows.values():
+                self._resize_row(row)
+        self._update_size()
+        self._update_rows()
+
+    def _update_size(self):
+        cross_size = self._cross_size or 1
+        if self.vertical:
+            self.set_size(cross_size, max(self.total_size, 1))
+        else:
+            self.set_size(max(self.total_size, 1), cross_size)
+
+    def _visible_bounds(self) -> tuple[int, int]:
+        if not self.items:
+            return 0, 0
+        if self._adjustment is None:
+            start, end = 0, self.offset_of(min(len(self.items), 16))
+        else:
+            start = self._adjustment.get_value()
+            end = start + max(self._adjustment.get_page_size(), 1)
+        first = max(self.index_at(start) - self.overscan, 0)
+        last = min(self.index_at(end) + self.overscan + 1, len(self.items))
+        return first, last
+
+    def _update_rows(self, animate: bool = False):
+        first, last = self._visible_bounds()
+        wanted = {}
+        for index in range(first, last):
+            wanted.setdefault(self.key(self.items[index]), index)
+
+        for key in list(self._rows):
+            if key not in wanted:
+                self._release_row(self._rows.pop(key))
+
+        for key, index in wanted.items():
+            item = self.items[index]
+            row = self._rows.get(key)
+            if row is None:
+                row = self._acquire_row(animate)
+                self._bind(row, item)
+                self._rows[key] = row
+            elif row.item != item:
+                self._bind(row, item)
+            self._place_row(row, index)
+
+        if not self._measured and self._rows:
+            self._measure_row(next(iter(self._rows.values())))
+
+        if (first, last) != self._range:
+            self._range = (first, last)
+            if self.on_range_changed is not None:
+                self.on_range_changed(first, last)
+
+    def _measure_row(self, sample: Gtk.Widget):
+        self._measured = True
+        sample.set_size_request(-1, -1)
+        if self.vertical:
+            size = sample.get_preferred_height()[0]
+        else:
+            size = sample.get_preferred_width()[0]
+        if size > self.row_size:
+            self.row_size = size
+            self._update_size()
+        for row in self._rows.values():
+            self._resize_row(row)
+            self._place_row(row, row.index)
+
+    def _bind(self, row: Gtk.Widget, item: Any):
+        self.bind_row(row, item)
+        row.item = item
+
+    def _place_row(self, row: Gtk.Widget, index: int):
+        size = self.size_of(index)
+        offset = self.offset_of(index)
+        row.index = index
+        if getattr(row, "offset", None) == offset and getattr(row, "size", None) == size:
+            return
+        row.offset = offset
+        row.size = size
+        self._resize_row(row)
+        x, y = (0, offset) if self.vertical else (offset, 0)
+        if row.get_parent() is None:
+            self.put(row, x, y)
+        else:
+            self.move(row, x, y)
+
+    def _resize_row(self, row: Gtk.Widget):
+        size = getattr(row, "size", None)
+        if size is None:
+            return
+        cross_size = self._cross_size or -1
+        if self.vertical:
+            row.set_size_request(cross_size, size)
+        else:
+            row.set_size_request(size, cross_size)
+
+    def _acquire_row(self, animate: bool) -> Gtk.Widget:
+        if self._pool:
+            row = self._pool.pop()
+        else:
+            row = self.create_row()
+            row.show_all()
+            row.set_no_show_all(True)
+        row.show()
+        if animate:
+            row.get_style_context().add_class("fade-in")
+        return row
+
+    def _release_row(self, row: Gtk.Widget):
+        row.hide()
+        row.item = None
+        row.get_style_context().remove_class("fade-in")
+        self._pool.append(row)
@@ -1,6 +1,8 @@
-import subprocess
+import time
+from collections import deque
 
-from gi.repository import GLib, GdkPixbuf
+from gi.repository import GLib
+from loguru import logger
 
 from fabric.widgets.box import Box
 from fabric.widgets.centerbox import CenterBox
@@ -10,9 +12,34 @@ from fabric.widgets.image import Image
 from fabric.widgets.entry import Entry
 from fabric.widgets.scrolledwindow import ScrolledWindow
 
-from utils.clipboard_history import get_clipboard_history
+from utils.clipboard_history import CliphistDatabase
+from utils.clipboard_index import ClipboardIndex, highlight_spans, snippet
+from utils.clipboard_payloads import ClipboardPayloads
+from utils.clipboard_thumbnails import ClipboardThumbnails
+from utils.clipboard_watcher import ClipboardWatcher
+from utils.load_config import config
+from utils.process import spawn
+from utils.query_engine import QueryEngine
+from utils.text_preview import PreviewLayouts, configure_label
 
 from widgets.base import AnimatedWindow as Window
+from widgets.base import RenderScheduler, VirtualList
+from widgets.base.render_scheduler import summarize
+
+PAGE_SIZE = 100
+ROW_PADDING = (24, 20)
+DEFAULT_ROW_WIDTH = 560
+
+
+def highlight_markup(text: str, spans: list[tuple[int, int]]) -> str:
+    parts = []
+    last = 0
+    for start, end in spans:
+        parts.append(GLib.markup_escape_text(text[last:start]))
+        parts.append(f"<b>{GLib.markup_escape_text(text[start:end])}</b>")
+        last = end
+    parts.append(GLib.markup_escape_text(text[last:]))
+    return "".join(parts)
 
 
 class Clipboard(Window):
@@ -27,15 +54,50 @@ class Clipboard(Window):
             visible=False,
             all_visible=False,
         )
-        self.buffers = get_clipboard_history()
+        self.buffers = []
+        self.search_results = []
         self.visible_buffers = []
+        self.matched_terms = frozenset()
+        self.rendered_terms = frozenset()
+        self.result_limit = PAGE_SIZE
+        self.query_engine = QueryEngine(self.buffers, haystack=lambda buffer: buffer.preview)
+        self.database = CliphistDatabase() if config.get("clipboard_backend") == "database" else None
+        self.payloads = ClipboardPayloads(database=self.database)
+        self.thumbnails = ClipboardThumbnails(height=80, payloads=self.payloads)
+        self.paste_times = deque(maxlen=32)
+        self.preview_lines = config.get("clipboard_preview_lines", 3)
+        self.previews = PreviewLayouts(
+            max_lines=self.preview_lines,
+            max_chars=config.get("clipboard_preview_chars", 300),
+        )
+        self.watcher = ClipboardWatcher(
+            capacity=config.get("clipboard_history_size", 50),
+            database=self.database,
+        )
+        self.search_index = ClipboardIndex(
+            database=self.database,
+            max_entries=config.get("clipboard_index_size", 10000),
+            on_changed=self.on_index_changed,
+        )
         self.focus_index = -1
         self.focus_mode = False
-        self.buttons = []
         self.set_app_paintable(True)
-        self._refresh_timeout_id = None
 
-        self.viewport = Box(orientation="v", spacing=4)
+        self.viewport = VirtualList(
+            key=lambda buffer_data: buffer_data.id,
+            create_row=self.create_app_button,
+            bind_row=self.bind_app_button,
+            row_size=self.get_row_size,
+            orientation="v",
+            spacing=4,
+            on_range_changed=self.on_range_changed,
+        )
+        self.render_scheduler = RenderScheduler(
+            self,
+            render=self.update_rows,
+            compute=self.filter_buffers,
+            frame_budget=config.get("frame_budget_ms", 12.0),
+        )
 
         self.set_opacity(0)
 
@@ -71,108 +133,163 @@ class Clipboard(Window):
         self.children = CenterBox(center_children=box)
 
         self.refresh_buttons()
+        self.watcher.connect("changed", self.on_history_changed)
+        self.watcher.start()
+        self.search_index.sync()
 
         self.connect("key-release-event", self.on_window_key_release)
         self.connect("focus-out-event", self.on_focus_out)
 
     def refresh_buttons(self):
-        if self._refresh_timeout_id is not None:
-            GLib.source_remove(self._refresh_timeout_id)
-            self._refresh_timeout_id = None
-
-        old_children = list(self.viewport.children)
-
-        for child in old_children:
-            child.get_style_context().add_class("fade-out")
-
-        def remove_old_and_add_new():
-
-            for child in old_children:
-                self.viewport.remove(child)
-
-            self.buttons = []
-            max_buttons_to_show = 20
-            buttons_to_show = self.visible_buffers[:max_buttons_to_show]
-
-            for app in buttons_to_show:
-                btn = self.create_app_button(app)
-                btn.get_style_context().add_class("fade-in")
-                self.viewport.add(btn)
-                self.buttons.append(btn)
-
-            item_height = 40  
-            spacing = self.viewport.get_spacing() or 4
-
-            new_height = min(len(buttons_to_show) * (item_height + spacing), 420)
-
-            self.anim_target_height = new_height
-            self.anim_target_opacity = 1.0
-            self.anim_search_target_opacity = 1.0
-
-            self.anim_target_content_height = new_height + 20
-
-            if not self.animation_running:
-                self.animation_running = True
-                GLib.timeout_add(10, self.animation_step)
-
+        self.render_scheduler.schedule(compute=False)
+
+    def on_history_changed(self, watcher):
+        self.buffers = watcher.entries
+        self.thumbnails.prune(buffer.id for buffer in self.buffers)
+        self.query_engine.set_items(self.buffers)
+        self.search_index.update(self.buffers, complete=len(self.buffers) < self.watcher.capacity)
+        self.render_scheduler.schedule()
+
+    def on_index_changed(self):
+        if self.search.get_text().strip():
+            self.render_scheduler.schedule()
+
+    def on_range_changed(self, first, last):
+        if last >= len(self.visible_buffers) and len(self.visible_buffers) < len(self.search_results):
+            self.result_limit += PAGE_SIZE
+            self.visible_buffers = self.search_results[:self.result_limit]
+            self.render_scheduler.schedule(compute=False)
+
+    def update_rows(self):
+        rendered = self.viewport.items
+        # A render that only appends a page keeps keyboard focus in place.
+        appended = len(self.visible_buffers) > len(rendered) and self.visible_buffers[:len(rendered)] == rendered
+        self.viewport.set_items(self.visible_buffers)
+        if self.rendered_terms != self.matched_terms:
+            self.rendered_terms = self.matched_terms
+            self.viewport.refresh()
+        new_height = min(self.viewport.total_size, 420)
+
+        self.anim_target_height = new_height
+        self.anim_target_opacity = 1.0
+        self.anim_search_target_opacity = 1.0
+
+        self.anim_target_content_height = new_height + 20
+
+        if not self.animation_running:
+            self.animation_running = True
+            GLib.timeout_add(10, self.animation_step)
+
+        if not appended:
             self.focus_index = -1
             self.focus_mode = False
 
-            self._refresh_timeout_id = None
-            return False
-
-        self._refresh_timeout_id = GLib.timeout_add(160, remove_old_and_add_new)
-
-    def create_app_button(self, buffer_data):
-        buffer_id = buffer_data["id"]
-        raw_text = buffer_data["raw"]
-        is_binary = buffer_data["is_binary"]
-
-        if is_binary:
-            proc = subprocess.run(["cliphist", "decode", str(buffer_id)], capture_output=True)
-            image_bytes = proc.stdout
-
-            loader = GdkPixbuf.PixbufLoader.new()
-            loader.write(image_bytes)
-            loader.close()
-            pixbuf = loader.get_pixbuf()
-
-            target_height = 80
-            original_width = pixbuf.get_width()
-            original_height = pixbuf.get_height()
-            target_width = int(original_width * (target_height / original_height))
-
-            pixbuf = pixbuf.scale_simple(target_width, target_height, GdkPixbuf.InterpType.BILINEAR)
-
-            image = Image(pixbuf=pixbuf, size=(0, target_height), keep_aspect=False)
-            box = Box(orientation="h", spacing=6, children=[image], h_expand=True)
-
-        else:
-            label = Label(label=raw_text.split("\t", 1)[-1])
-            box = Box(orientation="h", spacing=6, children=[label], h_expand=True)
+    def create_app_button(self):
+        image = Image(size=(0, 80), keep_aspect=False)
+        label = Label(h_expand=True)
+        configure_label(label, self.preview_lines)
+        image.set_no_show_all(True)
+        label.set_no_show_all(True)
+        box = Box(orientation="h", spacing=6, children=[image, label], h_expand=True)
 
         btn = Button(child=box, name="clipboard-buffer-button")
+        btn.buffer_image = image
+        btn.buffer_label = label
+        btn.buffer_id = None
 
         def on_click(*_):
             self.animate_hide()
-            proc = subprocess.Popen(["cliphist", "decode", str(buffer_id)], stdout=subprocess.PIPE)
-            subprocess.run(["wl-copy"], stdin=proc.stdout)
-            proc.stdout.close()
-            proc.wait()
-
+            self.paste(btn.item)
             GLib.timeout_add(500, lambda: self.search.set_text("") or False)
 
+        def on_focus_in(*_):
+            if btn.item is not None:
+                self.payloads.request(btn.item.id)
+
         btn.connect("clicked", on_click)
+        btn.connect("focus-in-event", on_focus_in)
         btn._launcher_click = on_click
         return btn
 
+    @property
+    def paste_timings(self) -> dict:
+        return summarize(self.paste_times)
+
+    def paste(self, entry):
+        start = time.perf_counter()
+        cached = self.payloads.get(entry.id) is not None
+
+        def on_copied(returncode, _, size):
+            elapsed = (time.perf_counter() - start) * 1000
+            self.paste_times.append(elapsed)
+            logger.info(
+                f"[Clipboard] Pasted {entry.id} ({size} bytes, {'cached' if cached else 'fetched'}) "
+                f"in {elapsed:.1f} ms, wl-copy exited with {returncode}"
+            )
+
+        def on_payload(data):
+            if data is None:
+                logger.warning(f"[Clipboard] Could not read entry {entry.id}")
+                return
+            argv = ["wl-copy", "--type", entry.mime] if entry.is_binary else ["wl-copy"]
+            spawn(
+                argv,
+                on_done=lambda returncode, output: on_copied(returncode, output, len(data)),
+                input=memoryview(data),
+            )
+
+        self.payloads.request(entry.id, on_payload)
+
+    def bind_app_button(self, btn, buffer_data):
+        buffer_id = buffer_data.id
+        raw_text = buffer_data.preview
+        is_binary = buffer_data.is_binary
+
+        if is_binary:
+            def on_thumbnail(pixbuf):
+                if btn.buffer_id == buffer_id:
+                    btn.buffer_image.set_from_pixbuf(pixbuf)
+
+            btn.buffer_id = buffer_id
+            btn.buffer_image.set_from_pixbuf(None)
+            btn.buffer_image.set_visible(True)
+            btn.buffer_label.set_visible(False)
+            self.thumbnails.request(buffer_id, on_thumbnail)
+        else:
+            btn.buffer_id = buffer_id
+            text = self.get_preview(buffer_data).text
+            spans = highlight_spans(text, self.matched_terms) if self.matched_terms else []
+            if self.matched_terms and not spans:
+                text = " ".join((self.search_index.text(buffer_id) or raw_text).split())
+                text, spans = snippet(text, highlight_spans(text, self.matched_terms))
+            btn.buffer_label.set_markup(highlight_markup(text, spans))
+            btn.buffer_label.set_visible(True)
+            btn.buffer_image.set_visible(False)
+
+    def get_preview(self, buffer_data):
+        width = self.viewport.get_allocated_width()
+        width = (width if width > 1 else DEFAULT_ROW_WIDTH) - ROW_PADDING[0]
+        text = self.search_index.text(buffer_data.id) or buffer_data.preview
+        return self.previews.get(buffer_data.id, text, self.viewport.get_pango_context(), width)
+
+    def get_row_size(self, buffer_data):
+        if buffer_data.is_binary:
+            return 100
+        return max(44, self.get_preview(buffer_data).height + ROW_PADDING[1])
+
+    def filter_buffers(self):
+        query = self.search.get_text().strip()
+        if not query:
+            self.search_results, self.matched_terms = self.buffers, frozenset()
+        elif len(self.search_index):
+            self.search_results, self.matched_terms = self.search_index.search(query)
+        else:
+            self.search_results, self.matched_terms = self.query_engine.search(query), frozenset()
+        self.result_limit = PAGE_SIZE
+        self.visible_buffers = self.search_results[:self.result_limit]
+
     def on_search_changed(self, entry):
-        text = entry.get_text().strip().casefold()
-        self.visible_buffers = [
-            buffer for buffer in self.buffers
-            if text in buffer["raw"].casefold()
-        ]
-        self.refresh_buttons()
+        self.render_scheduler.schedule()
 
     def on_window_key_release(self, widget, event):
         keyval = event.get_keyval()[1]
@@ -181,20 +298,20 @@ class Clipboard(Window):
             return True
         if self.focus_mode:
             if keyval == 65364:
-                if self.focus_index < len(self.buttons) - 1:
+                if self.focus_index < len(self.viewport) - 1:
                     self.focus_index += 1
-                    self.buttons[self.focus_index].grab_focus()
+                    self.viewport.get_row(self.focus_index).grab_focus()
                 return True
 
             if keyval == 65362:
                 if self.focus_index > 0:
                     self.focus_index -= 1
-                    self.buttons[self.focus_index].grab_focus()
+                    self.viewport.get_row(self.focus_index).grab_focus()
                 return True
 
             if keyval == 65293:
-                if 0 <= self.focus_index < len(self.buttons):
-                    self.buttons[self.focus_index]._launcher_click
+                if 0 <= self.focus_index < len(self.viewport):
+                    self.viewport.get_row(self.focus_index)._launcher_click
                 return True
 
             self.focus_mode = False
@@ -203,10 +320,10 @@ class Clipboard(Window):
 
         else:
             if keyval == 65364:
-                if self.buttons:
+                if len(self.viewport):
                     self.focus_mode = True
                     self.focus_index = 0
-                    self.buttons[0].grab_focus()
+                    self.viewport.get_row(0).grab_focus()
                 return True
         return False
 
@@ -228,8 +345,8 @@ class Clipboard(Window):
 
     
     def animate_show(self):
-        self.refresh_buttons()
-        self.buffers = get_clipboard_history()
-        self.visible_buffers = self.buffers.copy()
+        self.render_scheduler.schedule()
+        if self.database is None:
+            self.watcher.queue_refresh()
         GLib.idle_add(self.search.grab_focus)
         super().animate_show()
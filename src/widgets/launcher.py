@@ -1,6 +1,7 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+
 from gi.repository import GLib
 
-from fabric.utils import get_desktop_applications
 from fabric.widgets.box import Box
 from fabric.widgets.centerbox import CenterBox
 from fabric.widgets.label import Label
@@ -11,10 +12,23 @@ from fabric.widgets.scrolledwindow import ScrolledWindow
 
 from commands.commands import get_custom_commands
 
+from utils.app_catalog import AppCatalog
+from utils.icon_cache import get_icon_source, icon_cache
 from utils.load_config import config
 from utils.path import get_root_path
+from utils.search_index import SearchIndex
+from utils.usage_store import UsageStore
 
 from widgets.base import AnimatedWindow as Window
+from widgets.base import RenderScheduler, VirtualList
+
+PAGE_SIZE = 50
+FIRST_SCREEN_SIZE = 20
+INCREMENTAL_CHANGES = 32
+
+
+def get_app_key(app) -> str:
+    return getattr(app, "id", None) or f"command:{app.name}"
 
 
 class Launcher(Window):
@@ -29,19 +43,40 @@ class Launcher(Window):
             visible=False,
             all_visible=False,
         )
-        self.all_apps = get_desktop_applications()
-        self.visible_apps = self.all_apps.copy()
+        self.catalog = AppCatalog()
+        self.usage = UsageStore()
+        self.all_apps = self.catalog.applications
         self.commands = get_custom_commands()
+        self.app_index = SearchIndex(key=get_app_key)
+        self.command_index = SearchIndex(self.commands, key=get_app_key)
+        self._index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="launcher-index")
+        self._index_generation = 0
+        self._index_building = False
+        self.rebuild_app_index()
+        self.result_limit = PAGE_SIZE
+        self.visible_apps = self.search_apps("")
         self.focus_index = -1
         self.focus_mode = False
-        self.buttons = []
         self.set_app_paintable(True)
-        self._refresh_timeout_id = None
 
         self.anim_current_content_height = 300
         self.anim_target_content_height = 300
 
-        self.viewport = Box(orientation="v", spacing=4)
+        self.viewport = VirtualList(
+            key=get_app_key,
+            create_row=self.create_app_button,
+            bind_row=self.bind_app_button,
+            row_size=48,
+            orientation="v",
+            spacing=4,
+            on_range_changed=self.on_range_changed,
+        )
+        self.render_scheduler = RenderScheduler(
+            self,
+            render=self.update_rows,
+            compute=self.filter_apps,
+            frame_budget=config.get("frame_budget_ms", 12.0),
+        )
 
         self.set_opacity(0)
 
@@ -109,57 +144,64 @@ class Launcher(Window):
 
         self.connect("key-release-event", self.on_window_key_release)
         self.connect("focus-out-event", self.on_focus_out)
+        self.catalog.connect("changed", self.on_catalog_changed)
+
+        icon_cache.warm(map(get_icon_source, self.commands), 30, self.get_scale_factor())
+        icon_cache.warm_lookups(map(get_icon_source, self.all_apps), 30, self.get_scale_factor())
+
+    # Indexing a large catalog takes a noticeable fraction of a second, so
+    # the index is built on a worker and swapped in on the main loop.
+    def rebuild_app_index(self):
+        self._index_generation += 1
+        self._index_building = True
+        generation = self._index_generation
+        future = self._index_executor.submit(SearchIndex, self.catalog.applications, key=get_app_key)
+        future.add_done_callback(lambda future: GLib.idle_add(self.on_app_index_built, generation, future))
+
+    def on_app_index_built(self, generation: int, future: Future):
+        if generation == self._index_generation:
+            self._index_building = False
+            self.app_index = future.result()
+            self.all_apps = self.app_index.items
+            # The launcher opens on the frecency-ranked list, so those icons
+            # are decoded ahead of the first render.
+            first_screen = self.search_apps("")[:FIRST_SCREEN_SIZE]
+            icon_cache.warm(map(get_icon_source, first_screen), 30, self.get_scale_factor())
+            self.render_scheduler.schedule()
+        return False
 
     def refresh_buttons(self):
-        if self._refresh_timeout_id is not None:
-            GLib.source_remove(self._refresh_timeout_id)
-            self._refresh_timeout_id = None
-
-        old_children = list(self.viewport.children)
+        self.render_scheduler.schedule(compute=False)
 
-        for child in old_children:
-            child.get_style_context().add_class("fade-out")
+    def on_range_changed(self, first, last):
+        if last >= len(self.visible_apps) and len(self.visible_apps) >= self.result_limit:
+            self.result_limit += PAGE_SIZE
+            self.render_scheduler.schedule()
 
-        def remove_old_and_add_new():
-            for child in old_children:
-                self.viewport.remove(child)
+    def update_rows(self):
+        rendered = self.viewport.items
+        # A render that only appends a page keeps keyboard focus in place.
+        appended = len(self.visible_apps) > len(rendered) and self.visible_apps[:len(rendered)] == rendered
+        self.viewport.set_items(self.visible_apps)
+        new_height = min(self.viewport.total_size, 400)
 
-            self.buttons = []
-            max_buttons_to_show = 20
-            buttons_to_show = self.visible_apps[:max_buttons_to_show]
+        self.anim_current_content_height = new_height
+        self.anim_target_opacity = 1.0
+        self.anim_search_target_opacity = 1.0
 
-            for app in buttons_to_show:
-                btn = self.create_app_button(app)
-                btn.get_style_context().add_class("fade-in")
-                self.viewport.add(btn)
-                self.buttons.append(btn)
+        self.anim_target_content_height = new_height + 20
 
-            item_height = 40
-            spacing = self.viewport.get_spacing() or 4
-            new_height = min(len(buttons_to_show) * (item_height + spacing), 400)
-
-            self.anim_current_content_height = new_height
-            self.anim_target_opacity = 1.0
-            self.anim_search_target_opacity = 1.0
-
-            self.anim_target_content_height = new_height + 20
-
-            if not self.animation_running:
-                self.animation_running = True
-                GLib.timeout_add(10, self.animation_step)
+        if not self.animation_running:
+            self.animation_running = True
+            GLib.timeout_add(10, self.animation_step)
 
+        if not appended:
             self.focus_index = -1
             self.focus_mode = False
 
-            self._refresh_timeout_id = None
-            return False
-
-        self._refresh_timeout_id = GLib.timeout_add(160, remove_old_and_add_new)
-
-    def create_app_button(self, app):
-        icon = Image(pixbuf=app.get_icon_pixbuf(size=30))
+    def create_app_button(self):
+        icon = Image()
         label = Label(
-            label=app.display_name or app.name or "Unknown",
             h_expand=True,
             h_align="start",
             size_hint=(1.0, None),
@@ -169,7 +211,6 @@ class Launcher(Window):
             """
         )
         desc = Label(
-            label=app.description or "",
             size_hint=(1.0, None),
             h_expand=True,
             h_align="start",
@@ -186,10 +227,14 @@ class Launcher(Window):
         box = Box(orientation="h", spacing=6, children=[icon, label_data_box], h_expand=True)
 
         btn = Button(child=box, name="launcher-app-button")
+        btn.app_icon = icon
+        btn.app_label = label
+        btn.app_description = desc
 
         def on_click(*_):
             self.animate_hide()
-            app.launch()
+            self.usage.record(get_app_key(btn.item))
+            btn.item.launch()
 
             def clear_text_later():
                 self.search.set_text("")
@@ -201,23 +246,37 @@ class Launcher(Window):
         btn._launcher_click = on_click
         return btn
 
+    def bind_app_button(self, btn, app):
+        icon_cache.bind(btn.app_icon, get_icon_source(app), 30)
+        btn.app_label.set_label(app.display_name or app.name or "Unknown")
+        btn.app_description.set_label(app.description or "")
+
+    def on_catalog_changed(self, _, added, removed):
+        icon_cache.warm_lookups(map(get_icon_source, added), 30, self.get_scale_factor())
+        if self._index_building or len(added) + len(removed) > INCREMENTAL_CHANGES:
+            self.rebuild_app_index()
+            return
+        for app in removed:
+            self.app_index.remove(app)
+        self.app_index.extend(added)
+        self.all_apps = self.app_index.items
+        self.on_search_changed(self.search)
+
+    def search_apps(self, text):
+        prefix = config.get("prefix", ">")
+        boosts = self.usage.boosts()
+        if not text:
+            boosts = {key: boosts[key] for key in self.usage.top(self.result_limit)}
+        elif text.startswith(prefix):
+            return self.command_index.search(text[len(prefix):], self.result_limit, boosts)
+        return self.app_index.search(text, self.result_limit, boosts)
+
+    def filter_apps(self):
+        self.visible_apps = self.search_apps(self.search.get_text().strip())
+
     def on_search_changed(self, entry):
-        text = entry.get_text().strip().casefold()
-        if text.startswith(config.get("prefix", ">")):
-            self.visible_apps = [
-                cmd
-                for cmd in self.commands
-                if text[1:]
-                in ((cmd.display_name or "") + " " + (cmd.name or "" + " " + (cmd.description or ""))).casefold()
-            ]
-        else:
-            self.visible_apps = [
-                app
-                for app in self.all_apps
-                if text
-                in ((app.display_name or "") + " " + (app.name or "") + " " + (app.description or "")).casefold()
-            ]
-        self.refresh_buttons()
+        self.result_limit = PAGE_SIZE
+        self.render_scheduler.schedule()
 
     def on_window_key_release(self, widget, event):
         keyval = event.get_keyval()[1]
@@ -226,20 +285,20 @@ class Launcher(Window):
             return True
         if self.focus_mode:
             if keyval == 65364:
-                if self.focus_index < len(self.buttons) - 1:
+                if self.focus_index < len(self.viewport) - 1:
                     self.focus_index += 1
-                    self.buttons[self.focus_index].grab_focus()
+                    self.viewport.get_row(self.focus_index).grab_focus()
                 return True
 
             if keyval == 65362:
                 if self.focus_index > 0:
                     self.focus_index -= 1
-                    self.buttons[self.focus_index].grab_focus()
+                    self.viewport.get_row(self.focus_index).grab_focus()
                 return True
 
             if keyval == 65293:
-                if 0 <= self.focus_index < len(self.buttons):
-                    self.buttons[self.focus_index]._launcher_click
+                if 0 <= self.focus_index < len(self.viewport):
+                    self.viewport.get_row(self.focus_index)._launcher_click
                 return True
 
             self.focus_mode = False
@@ -248,10 +307,10 @@ class Launcher(Window):
 
         else:
             if keyval == 65364:
-                if self.buttons:
+                if len(self.viewport):
                     self.focus_mode = True
                     self.focus_index = 0
-                    self.buttons[0].grab_focus()
+                    self.viewport.get_row(0).grab_focus()
                 return True
         return False
 
@@ -272,7 +331,6 @@ class Launcher(Window):
         return cont
 
     def animate_show(self):
-        self.refresh_buttons()
-        self.visible_apps = self.all_apps.copy()
+        self.render_scheduler.schedule()
         GLib.idle_add(self.search.grab_focus)
         super().animate_show()
@@ -1,8 +1,4 @@
-import os
-import subprocess
-import threading
-
-from gi.repository import GLib, GdkPixbuf
+from gi.repository import GLib
 from fabric.widgets.box import Box
 from fabric.widgets.centerbox import CenterBox
 from fabric.widgets.label import Label
@@ -12,7 +8,20 @@ from fabric.widgets.entry import Entry
 from fabric.widgets.scrolledwindow import ScrolledWindow
 
 from widgets.base import AnimatedWindow as Window
+from widgets.base import RenderScheduler, VirtualList
 from utils.notify_system import send_notification
+from utils.load_config import config
+from utils.lru import LRUCache
+from utils.query_engine import QueryEngine
+from utils.thumbnails import ThumbnailCache, ThumbnailPool
+from utils.wallpaper_apply import WallpaperApplier
+from utils.wallpaper_index import WallpaperIndex
+from utils.wallpaper_library import WallpaperLibrary
+
+THUMBNAIL_HEIGHT = 190
+TILE_WIDTH = THUMBNAIL_HEIGHT * 16 // 9
+PREFETCH_RATIO = 0.75
+LIKE_PREFIX = "like:"
 
 class WallpaperChooser(Window):
     def __init__(self, wallpapers_path="~/.local/share/wallpapers"):
@@ -27,17 +36,47 @@ class WallpaperChooser(Window):
             all_visible=False,
         )
 
-        self.wallpapers_path = os.path.expanduser(wallpapers_path)
-        self.all_wallpapers = self.get_wallpapers_list()
+        roots = [wallpapers_path] if isinstance(wallpapers_path, str) else wallpapers_path
+        self.library = WallpaperLibrary(roots)
+        self.all_wallpapers = self.library.wallpapers
         self.visible_wallpapers = self.all_wallpapers.copy()
+        self.query_engine = QueryEngine(self.all_wallpapers, haystack=lambda wallpaper: wallpaper["name"])
         self.focus_index = -1
         self.focus_mode = False
-        self.buttons = []
         self.set_app_paintable(True)
-        self._refresh_timeout_id = None
-        self._loading_thread = None
-
-        self.viewport = Box(orientation="h", spacing=4)
+        self.thumbnails = ThumbnailCache(config.get("wallpaper_thumbnail_size", "x-large"))
+        self.thumbnail_pool = ThumbnailPool(
+            self.thumbnails, THUMBNAIL_HEIGHT, config.get("wallpaper_thumbnail_workers")
+        )
+        self.pixbufs = LRUCache(
+            config.get("wallpaper_thumbnail_memory_mb", 128) * 1024 * 1024,
+            lambda pixbuf: pixbuf.get_byte_length(),
+        )
+        self._max_loading = self.thumbnail_pool.workers * 2
+        self._loading = set()
+        self._failed = set()
+        self._load_order = iter(())
+        self.applier = WallpaperApplier(self.thumbnail_pool)
+        self.index = WallpaperIndex(self.thumbnail_pool, on_changed=self.on_index_changed)
+        self.collapse_duplicates = config.get("wallpaper_collapse_duplicates", True)
+
+        self.viewport = VirtualList(
+            key=lambda wallpaper: wallpaper["path"],
+            create_row=self.create_wallpaper_button,
+            bind_row=self.bind_wallpaper_button,
+            row_size=TILE_WIDTH,
+            orientation="h",
+            spacing=4,
+            on_range_changed=self.on_range_changed,
+        )
+        self.render_scheduler = RenderScheduler(
+            self,
+            render=self.update_rows,
+            compute=self.filter_wallpapers,
+            frame_budget=config.get("frame_budget_ms", 12.0),
+        )
+        self._loaded_tiles = []
+        self.tile_scheduler = RenderScheduler(self, render=self.update_tiles)
 
         self.set_opacity(0)
 
@@ -49,6 +88,15 @@ class WallpaperChooser(Window):
             size=(700, 0),
         )
 
+        self.no_wallpapers_label = Label(label="No Wallpapers", name="no-wallpapers-label")
+        self.no_wallpapers_label.get_style_context().add_class("large-text")
+        self.no_wallpapers_container = CenterBox(
+            center_children=self.no_wallpapers_label,
+            name="no-wallpapers-container",
+            size=(1120, 250),
+        )
+        self.no_wallpapers_container.set_no_show_all(True)
+
         self.wallpapers_scrolled = ScrolledWindow(
             child=self.viewport,
             min_content_size=(1120, 250),
@@ -61,6 +109,7 @@ class WallpaperChooser(Window):
 
         main_box = Box(orientation="v", spacing=1, name="wallpaper-main-box", children=[
             self.wallpapers_scrolled,
+            self.no_wallpapers_container,
             self.search,
         ])
 
@@ -70,119 +119,123 @@ class WallpaperChooser(Window):
 
         self.children = CenterBox(center_children=box)
 
-        self.no_wallpapers_label = Label(label="No Wallpapers", name="no-wallpapers-label")
-        self.no_wallpapers_label.get_style_context().add_class("large-text")
-        self.no_wallpapers_container = CenterBox(
-            center_children=self.no_wallpapers_label,
-            name="no-wallpapers-container",
-            size=(1120, 250),
-        )
-        self.no_wallpapers_container.set_visible(False)
-        self.viewport.add(self.no_wallpapers_container)
-
         self.connect("key-release-event", self.on_window_key_release)
         self.connect("focus-out-event", self.on_focus_out)
 
-        self.start_background_loading()
-
-    def get_wallpapers_list(self):
-        wallpapers = []
-        valid_extensions = (".png", ".jpg", ".jpeg", ".bmp")
-        if os.path.isdir(self.wallpapers_path):
-            for file in os.listdir(self.wallpapers_path):
-                if file.lower().endswith(valid_extensions):
-                    wallpapers.append({
-                        "name": file,
-                        "path": os.path.join(self.wallpapers_path, file),
-                        "pixbuf": None
-                    })
-        return wallpapers
+        self.library.connect("changed", self.on_library_changed)
+        self.load_visible_thumbnails()
+        self.index.sync(self.all_wallpapers)
+
+    def on_library_changed(self, _, added, removed):
+        for wallpaper in removed:
+            self.pixbufs.pop(wallpaper["path"])
+            self._failed.discard(wallpaper["path"])
+        self.index.remove(wallpaper["path"] for wallpaper in removed)
+        self.index.add(added)
+        self.all_wallpapers = self.library.wallpapers
+        self.query_engine.set_items(self.all_wallpapers)
+        self.render_scheduler.schedule()
+
+    def on_index_changed(self):
+        self.render_scheduler.schedule()
+
+    def needs_thumbnail(self, wallpaper):
+        path = wallpaper["path"]
+        return path not in self.pixbufs and path not in self._loading and path not in self._failed
+
+    def iter_load_order(self):
+        items = self.viewport.items or self.visible_wallpapers
+        first, last = self.viewport.visible_range
+        yield from items[first:last]
+        before, after = first - 1, last
+        while before >= 0 or after < len(items):
+            if self.pixbufs.total_bytes >= self.pixbufs.max_bytes * PREFETCH_RATIO:
+                return
+            if after < len(items):
+                yield items[after]
+                after += 1
+            if before >= 0:
+                yield items[before]
+                before -= 1
+
+    def load_visible_thumbnails(self):
+        self._load_order = self.iter_load_order()
+        self.dispatch_thumbnails()
+
+    def dispatch_thumbnails(self):
+        while len(self._loading) < self._max_loading:
+            wallpaper = next(self._load_order, None)
+            if wallpaper is None:
+                return
+            if self.needs_thumbnail(wallpaper):
+                self.load_pixbuf_async(wallpaper, self.on_pixbuf_loaded)
 
     def load_pixbuf_async(self, wallpaper, callback):
-        try:
-            pixbuf = GdkPixbuf.Pixbuf.new_from_file_at_size(wallpaper["path"], -1, 90)
-            target_height = 190
-            original_width = pixbuf.get_width()
-            original_height = pixbuf.get_height()
-            target_width = int(original_width * (target_height / original_height))
-            pixbuf = pixbuf.scale_simple(target_width, target_height, GdkPixbuf.InterpType.BILINEAR)
-            wallpaper["pixbuf"] = pixbuf
-        except Exception:
-            wallpaper["pixbuf"] = None
-        GLib.idle_add(callback, wallpaper)
-
-    def start_background_loading(self):
-        def load_wallpapers():
-            for wallpaper in self.all_wallpapers:
-                if wallpaper["pixbuf"] is None:
-                    self.load_pixbuf_async(wallpaper, self.on_pixbuf_loaded)
-            GLib.idle_add(self.refresh_buttons)
-
-        self._loading_thread = threading.Thread(target=load_wallpapers, daemon=True)
-        self._loading_thread.start()
-
-    def on_pixbuf_loaded(self, wallpaper):
-        if wallpaper in self.visible_wallpapers and self.is_visible():
-            self.refresh_buttons()
-
-    def refresh_buttons(self):
-        if self._refresh_timeout_id is not None:
-            GLib.source_remove(self._refresh_timeout_id)
-            self._refresh_timeout_id = None
-
-        old_children = list(self.viewport.children)
-        if self.no_wallpapers_label in old_children:
-            old_children.remove(self.no_wallpapers_container)
-
-        for child in old_children:
-            child.get_style_context().add_class("fade-out")
-
-        def remove_old_and_add_new():
-            for child in old_children:
-                self.viewport.remove(child)
-
-            self.buttons = []
-            buttons_to_show = self.visible_wallpapers
-
-            if not buttons_to_show:
-                self.viewport.add(self.no_wallpapers_container)
-                self.no_wallpapers_container.set_visible(True)
-            else:
-                self.no_wallpapers_container.set_visible(False)
-                for wallpaper in buttons_to_show:
-                    if wallpaper["pixbuf"] is not None:
-                        btn = self.create_wallpaper_button(wallpaper)
-                        btn.get_style_context().add_class("fade-in")
-                        self.viewport.add(btn)
-                        self.buttons.append(btn)
-
-            self.anim_target_opacity = 1.0
-            self.anim_search_target_opacity = 1.0
-
-            if not self.animation_running:
-                self.animation_running = True
-                GLib.timeout_add(10, self.animation_step)
-
-            self.focus_index = -1
-            self.focus_mode = False
-
-            self._refresh_timeout_id = None
+        self._loading.add(wallpaper["path"])
+        self.thumbnail_pool.submit(wallpaper["path"], lambda pixbuf: callback(wallpaper, pixbuf))
+
+    def on_pixbuf_loaded(self, wallpaper, pixbuf):
+        path = wallpaper["path"]
+        self._loading.discard(path)
+        if self.library.get(path) is not wallpaper:
+            self.load_visible_thumbnails()
             return False
+        if pixbuf is None:
+            self._failed.add(path)
+        else:
+            self.pixbufs.put(path, pixbuf)
+            self._loaded_tiles.append(wallpaper)
+            self.tile_scheduler.schedule()
+        self.dispatch_thumbnails()
+        return False
+
+    def on_range_changed(self, first, last):
+        self.load_visible_thumbnails()
+
+    def update_tiles(self):
+        loaded, self._loaded_tiles = self._loaded_tiles, []
+        for wallpaper in loaded:
+            self.viewport.refresh_item(wallpaper)
+
+    def update_rows(self):
+        buttons_to_show = [
+            wallpaper for wallpaper in self.visible_wallpapers if wallpaper["path"] not in self._failed
+        ]
+
+        if not buttons_to_show:
+            self.viewport.set_items([])
+            self.wallpapers_scrolled.set_visible(False)
+            self.no_wallpapers_container.show_all()
+        else:
+            self.no_wallpapers_container.set_visible(False)
+            self.wallpapers_scrolled.set_visible(True)
+            self.viewport.set_items(buttons_to_show)
+        self.load_visible_thumbnails()
+
+        self.anim_target_opacity = 1.0
+        self.anim_search_target_opacity = 1.0
 
-        self._refresh_timeout_id = GLib.timeout_add(100, remove_old_and_add_new)
+        if not self.animation_running:
+            self.animation_running = True
+            GLib.timeout_add(10, self.animation_step)
 
-    def create_wallpaper_button(self, wallpaper):
-        image = Image(pixbuf=wallpaper["pixbuf"], keep_aspect=True) if wallpaper["pixbuf"] else Label(label="[No Preview]", size=(190, 90))
+        self.focus_index = -1
+        self.focus_mode = False
+
+    def create_wallpaper_button(self):
+        image = Image(keep_aspect=True)
+        image.set_size_request(TILE_WIDTH, THUMBNAIL_HEIGHT)
         box = Box(orientation="v", spacing=0, children=[image], h_expand=False)
 
         btn = Button(child=box, name="wallpaper-button")
+        btn.wallpaper_image = image
 
         def on_click(*_):
+            wallpaper = btn.item
 
             self.animate_hide()
 
-            subprocess.Popen(f"swww img --transition-fps 144 --transition-duration 1 -t any {wallpaper['path']}", shell=True)
-            subprocess.Popen(f"ln -sf {wallpaper['path']} ~/.current.wall", shell=True)
+            self.applier.apply(wallpaper)
             send_notification(
                 "Wallpaper",
                 f"Wallpaper changed to {wallpaper['name']}",
@@ -191,17 +244,55 @@ class WallpaperChooser(Window):
             )
             GLib.timeout_add(500, lambda: self.search.set_text("") or False)
 
+        def on_button_press(_, event):
+            if event.button != 3 or btn.item is None:
+                return False
+            self.search.set_text(f"{LIKE_PREFIX}{btn.item['name']}")
+            return True
+
+        def on_prepare(*_):
+            if btn.item is not None:
+                self.applier.prepare(btn.item)
+            return False
+
         btn.connect("clicked", on_click)
+        btn.connect("button-press-event", on_button_press)
+        btn.connect("focus-in-event", on_prepare)
         btn._launcher_click = on_click
         return btn
 
+    def bind_wallpaper_button(self, btn, wallpaper):
+        style = btn.get_style_context()
+        pixbuf = self.pixbufs.get(wallpaper["path"])
+        if pixbuf is None:
+            btn.wallpaper_image.clear()
+            style.add_class("loading")
+        else:
+            if pixbuf.get_width() > TILE_WIDTH:
+                pixbuf = pixbuf.new_subpixbuf((pixbuf.get_width() - TILE_WIDTH) // 2, 0, TILE_WIDTH, THUMBNAIL_HEIGHT)
+            btn.wallpaper_image.set_from_pixbuf(pixbuf)
+            style.remove_class("loading")
+
+    def filter_wallpapers(self):
+        text = self.search.get_text().strip()
+        if text.startswith(LIKE_PREFIX):
+            self.visible_wallpapers = self.similar_wallpapers(text[len(LIKE_PREFIX):].strip())
+            return
+        wallpapers = self.query_engine.search(text)
+        if self.collapse_duplicates:
+            wallpapers = self.index.collapse(wallpapers, key=lambda wallpaper: wallpaper["path"])
+        self.visible_wallpapers = wallpapers
+
+    def similar_wallpapers(self, name):
+        matches = self.query_engine.search(name)
+        if not matches:
+            return []
+        source = matches[0]
+        similar = (self.library.get(path) for path in self.index.similar(source["path"]))
+        return [source, *(wallpaper for wallpaper in similar if wallpaper is not None)]
+
     def on_search_changed(self, entry):
-        text = entry.get_text().strip().casefold()
-        self.visible_wallpapers = [
-            wallpaper for wallpaper in self.all_wallpapers
-            if text in wallpaper["name"].casefold()
-        ]
-        self.refresh_buttons()
+        self.render_scheduler.schedule()
 
     def on_window_key_release(self, widget, event):
         keyval = event.get_keyval()[1]
@@ -210,21 +301,19 @@ class WallpaperChooser(Window):
             return True
         if self.focus_mode:
             if keyval == 65363:  # Right arrow
-                if self.focus_index < len(self.buttons) - 1:
+                if self.focus_index < len(self.viewport) - 1:
                     self.focus_index += 1
-                    self.buttons[self.focus_index].grab_focus()
-                    # GLib.idle_add(self.center_button, self.buttons[self.focus_index])
+                    self.viewport.get_row(self.focus_index).grab_focus()
                 return True
             if keyval == 65361:  # Left arrow
                 if self.focus_index > 0:
                     self.focus_index -= 1
-                    self.buttons[self.focus_index].grab_focus()
-                    # GLib.idle_add(self.center_button, self.buttons[self.focus_index])
+                    self.viewport.get_row(self.focus_index).grab_focus()
                 return True
 
             if keyval == 65293:
-                if 0 <= self.focus_index < len(self.buttons):
-                    self.buttons[self.focus_index]._launcher_click
+                if 0 <= self.focus_index < len(self.viewport):
+                    self.viewport.get_row(self.focus_index)._launcher_click
                 return True
 
             self.focus_mode = False
@@ -232,16 +321,14 @@ class WallpaperChooser(Window):
             return False
         else:
             if keyval == 65363 or keyval == 65361:  # Right or Left arrow
-                if self.buttons:
+                if len(self.viewport):
                     self.focus_mode = True
                     self.focus_index = 0
-                    self.buttons[0].grab_focus()
-                    # GLib.idle_add(self.center_button, self.buttons[0])
+                    self.viewport.get_row(0).grab_focus()
                 return True
         return False
     
     def animate_show(self):
-        self.refresh_buttons()
-        self.visible_wallpapers = self.all_wallpapers.copy()
+        self.render_scheduler.schedule()
         GLib.idle_add(self.search.grab_focus)
         super().animate_show()